@@ -0,0 +1,493 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from contextlib import aclosing, contextmanager
+from contextvars import ContextVar
+
+from context_builder import estimate_tokens
+from metrics import (AI_ATTEMPT_SECONDS, AI_HEDGES, AI_MODEL_FALLBACKS, AI_RATE_LIMITED, STARTUP_SECONDS, log_event,
+                     span)
+from scheduler import DEFAULT_OUTPUT_TOKENS, QuotaExceeded
+from shared_state import LocalState, after_fork
+
+
+# --- RESILIENT AI ENGINE (Async, Bounded, Circuit-Broken) ---
+
+# google.generativeai takes about a second to import; load_genai() does it once,
+# normally during startup warm-up rather than on the first request
+genai = None
+
+
+def load_genai():
+    global genai
+    if genai is None:
+        started = time.perf_counter()
+        import google.generativeai as module
+        module.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        genai = module
+        STARTUP_SECONDS.set(round(time.perf_counter() - started, 4), step="import_genai")
+    return genai
+
+# Attempts made under AIClient.count_attempts(), including by tasks started inside it
+_attempt_tally = ContextVar("ai_attempt_tally", default=None)
+
+class CircuitBreaker:
+    """
+    Per-model breaker. Opens after `failure_threshold` consecutive failures and
+    lets a single trial call through once `reset_timeout` seconds have passed.
+    While the trial runs, other callers treat the model as open and move on to
+    the next one; if the trial never reports back, it is offered again after
+    `probe_timeout`.
+
+    State lives in `state` (see shared_state) under `key`, so with a shared
+    backend every worker sees the same breaker.
+    """
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0, state=None, key: str = "breaker",
+                 probe_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.store = state or LocalState()
+        self.key = key
+
+    def _status(self, current):
+        opened_at = (current or {}).get("opened_at")
+        if opened_at is None:
+            return "closed"
+        if time.time() - opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    @property
+    def state(self):
+        # Sync read for status pages; the request path uses the async methods below
+        return self._status(self.store.get(self.key))
+
+    async def allow(self):
+        """
+        "closed" or "probe" if the call may go ahead, else None. Half-open, one
+        caller in any worker claims the trial ("probe"); for everyone else the
+        model stays open until the trial reports back.
+        """
+        def claim(current):
+            now = time.time()
+            if self._status(current) == "half-open" and (current.get("probe_until") or 0) <= now:
+                return {**current, "probe_until": now + self.probe_timeout}, True
+            return current, False
+
+        status = self._status(await self.store.aget(self.key))
+        if status == "closed":
+            return "closed"
+        if status == "open":
+            return None
+        return "probe" if await self.store.aupdate(self.key, claim) else None
+
+    async def release_probe(self):
+        """Hands a claimed trial back without a verdict (quota rejected it, or it was cancelled)."""
+        def release(current):
+            return ({**current, "probe_until": None} if current else current), None
+        await self.store.aupdate(self.key, release)
+
+    async def record_success(self):
+        if await self.store.aget(self.key):
+            await self.store.adelete(self.key)
+
+    async def record_failure(self):
+        def fail(current):
+            failures = (current or {}).get("failures", 0) + 1
+            opened_at = (current or {}).get("opened_at")
+            if failures >= self.failure_threshold:
+                # Re-arms the cool-down on every failure, including a failed half-open trial
+                opened_at = time.time()
+            return {"failures": failures, "opened_at": opened_at}, None
+        await self.store.aupdate(self.key, fail)
+
+
+def _percentile(values, pct: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _chunk_text(chunk):
+    # A chunk carrying only safety/finish metadata has no parts; .text raises on those
+    try:
+        return chunk.text
+    except (ValueError, AttributeError):
+        return ""
+
+
+class AIClient:
+    def __init__(self, models=None, max_concurrency=None, max_attempts=2,
+                 base_delay=None, max_delay=8.0, timeout=None, scheduler=None, state=None, hedge=None):
+        self.models = models or [
+            "models/gemini-2.0-flash",
+            "models/gemini-flash-latest",
+            "models/gemini-pro-latest"
+        ]
+        self.max_concurrency = max_concurrency or int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("AI_BACKOFF_BASE", "1.0"))
+        self.max_delay = max_delay
+        self.timeout = timeout or float(os.getenv("AI_TIMEOUT", "60"))
+        # Streams: max silence between chunks; the whole stream is still bounded by `timeout`
+        self.stream_chunk_timeout = float(os.getenv("AI_STREAM_CHUNK_TIMEOUT", "20"))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.breakers = {m: CircuitBreaker(state=state, key=f"breaker:{m}", probe_timeout=self.timeout)
+                         for m in self.models}
+        # One GenerativeModel per model name, reused by every call; rebuilt after fork
+        self._handles = {}
+        after_fork(self._handles.clear)
+        # Optional QuotaScheduler; without one, calls are only bounded by the semaphore
+        self.scheduler = scheduler
+        # Hedging (opt-in): if the first model is slower than a multiple of its median, race the next one
+        self.hedge = hedge if hedge is not None else os.getenv("AI_HEDGE") == "1"
+        self.hedge_delay_default = float(os.getenv("AI_HEDGE_DELAY", "2.0"))
+        self.hedge_min_delay = float(os.getenv("AI_HEDGE_MIN_DELAY", "0.2"))
+        self.hedge_multiplier = float(os.getenv("AI_HEDGE_MULTIPLIER", "3"))
+        self.hedge_max_ratio = float(os.getenv("AI_HEDGE_MAX_RATIO", "0.2"))
+        self.hedge_max_in_flight = int(os.getenv("AI_HEDGE_MAX_IN_FLIGHT", "2"))
+        self._hedges_in_flight = 0
+        # Recent successful attempt latencies per model (hedge deadline) and call latencies (p99 report)
+        self._attempt_latency = {m: deque(maxlen=200) for m in self.models}
+        self._call_latency = deque(maxlen=1000)
+        self.stats = {
+            "calls": 0,
+            "attempts": 0,
+            "successes": 0,
+            "failures": 0,
+            "rate_limited": 0,
+            "model_fallbacks": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "total_latency": 0.0,
+            "hedges_fired": 0,
+            "hedges_won": 0,
+            "hedges_skipped": 0,
+        }
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: sleep anywhere in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @contextmanager
+    def count_attempts(self):
+        """
+        Counts only the Gemini attempts this block (and the tasks it starts)
+        makes, unlike stats["attempts"], which also counts concurrent requests.
+        """
+        tally = {"attempts": 0}
+        token = _attempt_tally.set(tally)
+        try:
+            yield tally
+        finally:
+            _attempt_tally.reset(token)
+
+    def _count_attempt(self):
+        self.stats["attempts"] += 1
+        tally = _attempt_tally.get()
+        if tally is not None:
+            tally["attempts"] += 1
+
+    def model_handle(self, model_name: str):
+        handle = self._handles.get(model_name)
+        if handle is None:
+            handle = self._handles[model_name] = load_genai().GenerativeModel(model_name)
+        return handle
+
+    def warm(self):
+        """Imports the SDK and builds every model handle ahead of the first request."""
+        for model_name in self.models:
+            self.model_handle(model_name)
+
+    async def _admit(self, model_name: str, prompt: str, priority: str, max_wait: float = None):
+        if self.scheduler is not None:
+            await self.scheduler.acquire(model_name, priority, estimate_tokens(prompt) + DEFAULT_OUTPUT_TOKENS, max_wait)
+
+    async def _wait_after_429(self, model_name: str, attempt: int):
+        delay = self._backoff(attempt)
+        if self.scheduler is not None:
+            # The next _admit() waits out the cool-down in the model's queue (or rejects fast)
+            log_event("ai_quota_pause", model=model_name, delay_s=round(delay, 2))
+            await self.scheduler.throttle(model_name, delay)
+            return
+        log_event("ai_quota_backoff", model=model_name, delay_s=round(delay, 2))
+        with span("rate_limit_wait"):
+            await asyncio.sleep(delay)
+
+    def _raise_all_failed(self, errors, rejections, failed):
+        self.stats["failures"] += 1
+        if rejections and not failed:
+            # Every model was over quota or breaker-open: let the endpoint answer 503 / fall back
+            raise QuotaExceeded(f"All AI models over quota or circuit-open: {'; '.join(errors)}",
+                                min(rejections))
+        raise Exception(f"All AI models failed: {'; '.join(errors)}")
+
+    async def _call_model(self, model_name: str, prompt: str):
+        async with self._semaphore:
+            self.stats["in_flight"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+            try:
+                model = self.model_handle(model_name)
+                return await asyncio.wait_for(model.generate_content_async(prompt), self.timeout)
+            finally:
+                self.stats["in_flight"] -= 1
+
+    async def _model_attempts(self, prompt: str, priority: str, models, outcome: dict, claimed: set, attempt,
+                              hedge=False):
+        """
+        The model loop shared by generate_content and stream_content. Tries
+        `models` in order (breaker, quota admission, 429 retries) and re-yields
+        what `attempt(model_name)`, an async generator, yields; an attempt
+        that yields nothing counts as an empty answer. Until something is
+        yielded a failure moves on to the next model; after that it
+        propagates, since the output is already on its way. Failures are
+        recorded in `outcome`. Models in `claimed` are being tried by a
+        concurrent hedge and are skipped.
+        """
+        for index, model_name in enumerate(models):
+            if model_name in claimed:
+                continue
+            breaker = self.breakers[model_name]
+            permit = await breaker.allow()
+            if not permit:
+                outcome["rejections"].append(breaker.reset_timeout)
+                outcome["errors"].append(f"{model_name}: circuit open")
+                continue
+            try:
+                claimed.add(model_name)
+                if index > 0:
+                    self.stats["model_fallbacks"] += 1
+                    AI_MODEL_FALLBACKS.inc(model=model_name)
+                for attempt_no in range(self.max_attempts):
+                    try:
+                        # A hedge is only worth sending if quota is free right now
+                        await self._admit(model_name, prompt, priority, 0 if hedge else None)
+                    except QuotaExceeded as e:
+                        if hedge:
+                            claimed.discard(model_name)
+                            self.stats["hedges_skipped"] += 1
+                            AI_HEDGES.inc(outcome="skipped")
+                            return
+                        outcome["rejections"].append(e.retry_after)
+                        outcome["errors"].append(str(e))
+                        break # Try next model
+                    if hedge and attempt_no == 0:
+                        outcome["hedged"] = True
+                        self.stats["hedges_fired"] += 1
+                        AI_HEDGES.inc(outcome="fired")
+                    attempt_started = time.perf_counter()
+                    yielded = False
+                    try:
+                        log_event("ai_attempt", model=model_name, attempt=attempt_no + 1, hedge=hedge)
+                        self._count_attempt()
+                        async with aclosing(attempt(model_name)) as values:
+                            async for value in values:
+                                yielded = True
+                                yield value
+                    except asyncio.CancelledError:
+                        # The other side of a hedge answered first; quota for this call is spent regardless
+                        AI_ATTEMPT_SECONDS.observe(time.perf_counter() - attempt_started, model=model_name,
+                                                   outcome="cancelled")
+                        raise
+                    except Exception as e:
+                        err_msg = str(e) or type(e).__name__
+                        log_event("ai_attempt_failed", model=model_name, error=err_msg)
+                        rate_limited = "429" in err_msg
+                        AI_ATTEMPT_SECONDS.observe(time.perf_counter() - attempt_started, model=model_name,
+                                                   outcome="rate_limited" if rate_limited else "error")
+                        if rate_limited:
+                            AI_RATE_LIMITED.inc(model=model_name)
+                        if yielded:
+                            await breaker.record_failure()
+                            self.stats["failures"] += 1
+                            raise
+                        if rate_limited and attempt_no < self.max_attempts - 1:
+                            self.stats["rate_limited"] += 1
+                            await self._wait_after_429(model_name, attempt_no)
+                            continue # Retry
+                        await breaker.record_failure()
+                        outcome["failed"] += 1
+                        outcome["errors"].append(f"{model_name}: {err_msg}")
+                        break # Try next model
+                    AI_ATTEMPT_SECONDS.observe(time.perf_counter() - attempt_started, model=model_name,
+                                               outcome="ok" if yielded else "empty")
+                    if yielded:
+                        await breaker.record_success()
+                        return
+                if hedge:
+                    # A hedge covers one model; the primary chain carries on down the list
+                    return
+            finally:
+                if permit == "probe":
+                    # Clears the claim if no verdict was recorded (quota, cancellation), so another caller can probe
+                    await breaker.release_probe()
+
+    async def _try_models(self, prompt: str, priority: str, models, outcome: dict, claimed: set, hedge=False):
+        """One-shot generation over `models` (see _model_attempts); returns the response or None."""
+        async def call(model_name):
+            started = time.perf_counter()
+            response = await self._call_model(model_name, prompt)
+            if response and response.text:
+                self._attempt_latency[model_name].append(time.perf_counter() - started)
+                yield response
+
+        response = None
+        async with aclosing(self._model_attempts(prompt, priority, models, outcome, claimed, call, hedge)) as answers:
+            async for response in answers:
+                pass
+        return response
+
+    def hedge_delay(self, model_name: str) -> float:
+        """
+        Adaptive hedge deadline: AI_HEDGE_MULTIPLIER x the model's recent
+        median, or AI_HEDGE_DELAY until 20 samples exist. A percentile such as
+        p90 would by definition hedge ~10% of perfectly normal calls.
+        """
+        samples = self._attempt_latency[model_name]
+        if len(samples) < 20:
+            return self.hedge_delay_default
+        return max(self.hedge_min_delay, self.hedge_multiplier * _percentile(samples, 50))
+
+    def _hedge_allowed(self) -> bool:
+        # Caps: a share of all calls (quota cost), a number in flight at once, and a free
+        # concurrency slot (a hedge queued behind primaries would not arrive any sooner)
+        return (self.stats["hedges_fired"] < self.hedge_max_ratio * self.stats["calls"]
+                and self._hedges_in_flight < self.hedge_max_in_flight
+                and not self._semaphore.locked())
+
+    async def _hedged(self, prompt: str, priority: str, outcome: dict):
+        claimed = set()
+        tasks = [asyncio.ensure_future(self._try_models(prompt, priority, self.models, outcome, claimed))]
+        hedging = False
+
+        def release(_=None):
+            # Once per hedge: when it settles, or when the primary's answer ends the race
+            nonlocal hedging
+            if hedging:
+                hedging = False
+                self._hedges_in_flight -= 1
+
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(self.models[0]))
+            backups = [m for m in self.models[1:] if m not in claimed]
+            if not done and backups:
+                if self._hedge_allowed():
+                    hedging = True
+                    self._hedges_in_flight += 1
+                    tasks.append(asyncio.ensure_future(
+                        self._try_models(prompt, priority, backups, outcome, claimed, hedge=True)
+                    ))
+                    tasks[-1].add_done_callback(release)
+                else:
+                    self.stats["hedges_skipped"] += 1
+                    AI_HEDGES.inc(outcome="skipped")
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    response = task.result()
+                    if response is None:
+                        continue
+                    if outcome.get("hedged"):
+                        won = task is tasks[-1]
+                        self.stats["hedges_won"] += won
+                        AI_HEDGES.inc(outcome="won" if won else "lost")
+                    return response
+            return None
+        finally:
+            release()
+            # First answer wins; the other call is cancelled (its quota is already spent)
+            for task in tasks:
+                task.cancel()
+
+    async def generate_content(self, prompt: str, priority: str = "standard"):
+        outcome = {"errors": [], "rejections": [], "failed": 0}
+        self.stats["calls"] += 1
+        started = time.perf_counter()
+        if self.hedge and len(self.models) > 1:
+            response = await self._hedged(prompt, priority, outcome)
+        else:
+            response = await self._try_models(prompt, priority, self.models, outcome, set())
+        if response is not None:
+            elapsed = time.perf_counter() - started
+            self.stats["successes"] += 1
+            self.stats["total_latency"] += elapsed
+            self._call_latency.append(elapsed)
+            return response
+        self._raise_all_failed(outcome["errors"], outcome["rejections"], outcome["failed"])
+
+    async def _generate_stream(self, model_name: str, prompt: str, queue: asyncio.Queue):
+        """
+        Reads one Gemini stream into `queue`, ending with None. Holds a
+        concurrency slot only while Gemini is generating, however slowly the
+        client reads. A stalled chunk or an overlong stream raises TimeoutError.
+        """
+        try:
+            async with self._semaphore:
+                deadline = time.monotonic() + self.timeout
+                model = self.model_handle(model_name)
+                response = await asyncio.wait_for(model.generate_content_async(prompt, stream=True), self.timeout)
+                chunks = response.__aiter__()
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError(f"stream exceeded {self.timeout}s")
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), min(self.stream_chunk_timeout, remaining))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        stalled = min(self.stream_chunk_timeout, remaining)
+                        raise asyncio.TimeoutError(f"stream stalled for {stalled:.1f}s")
+                    text = _chunk_text(chunk)
+                    if text:
+                        queue.put_nowait(text)
+        finally:
+            queue.put_nowait(None)
+
+    async def stream_content(self, prompt: str, priority: str = "standard"):
+        """
+        Yields text chunks as Gemini produces them. Model fallback and 429
+        retries apply until the first chunk arrives; a failure after that
+        propagates to the caller, since the partial output is already sent.
+        """
+        outcome = {"errors": [], "rejections": [], "failed": 0}
+        self.stats["calls"] += 1
+        started = time.perf_counter()
+
+        async def stream(model_name):
+            queue = asyncio.Queue()
+            producer = asyncio.ensure_future(self._generate_stream(model_name, prompt, queue))
+            try:
+                while (text := await queue.get()) is not None:
+                    yield text
+                await producer
+            finally:
+                # Client went away: stop spending quota on output nobody will read
+                producer.cancel()
+
+        yielded = False
+        async with aclosing(self._model_attempts(prompt, priority, self.models, outcome, set(), stream)) as chunks:
+            async for text in chunks:
+                yielded = True
+                yield text
+        if yielded:
+            self.stats["successes"] += 1
+            self.stats["total_latency"] += time.perf_counter() - started
+            return
+        self._raise_all_failed(outcome["errors"], outcome["rejections"], outcome["failed"])
+
+    def snapshot(self):
+        stats = dict(self.stats)
+        stats["circuits"] = {m: b.state for m, b in self.breakers.items()}
+        stats["avg_latency"] = stats["total_latency"] / stats["successes"] if stats["successes"] else 0.0
+        # Over the last 1000 successful generate_content calls; compare runs with AI_HEDGE on and off
+        stats["latency_p50"] = round(_percentile(self._call_latency, 50), 4)
+        stats["latency_p99"] = round(_percentile(self._call_latency, 99), 4)
+        stats["hedging"] = self.hedge
+        stats["hedge_delay"] = {m: round(self.hedge_delay(m), 4) for m in self.models}
+        return stats
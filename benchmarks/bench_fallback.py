@@ -0,0 +1,75 @@
+"""
+Micro-benchmark for the fallback generator.
+
+    python benchmarks/bench_fallback.py --iterations 2000
+
+"before" reproduces the old call pattern (a full get_pro_fallback build for
+every section read, per-keyword substring scans); "after" is what the
+endpoints do now with one FallbackEngine per request and the
+combined word-bounded matcher (slightly slower than raw substring scans on
+short contexts, but it stops "Go" matching inside "Google").
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fallback_engine import TECH_PATTERNS, FallbackEngine, extract_tech_stack
+
+CONTEXT = (
+    "Google interview experience: 4 rounds covering DSA in C++ and Python, a system design round on "
+    "Kubernetes, Kafka and Redis, plus Googleyness. Candidates mention GCP, Docker, Go services, "
+    "React dashboards, CI/CD with Jenkins and Terraform, and SQL heavy data questions. "
+) * 5
+
+
+def legacy_tech_scan(context):
+    context_lower = context.lower()
+    tech_stack = []
+    for items in TECH_PATTERNS.values():
+        tech_stack.extend(i for i in items if i.lower() in context_lower)
+    return tech_stack
+
+
+def eager_interview_data():
+    # practice_links + roadmap each paid for a full guide build
+    FallbackEngine("Google", CONTEXT).guide()["practice_links"]
+    FallbackEngine("Google", CONTEXT).guide()["roadmap"]
+
+
+def lazy_interview_data():
+    fallback = FallbackEngine("Google", CONTEXT)
+    fallback.practice_links
+    fallback.roadmap
+
+
+def eager_mock_fallback():
+    random.sample(FallbackEngine("Google", CONTEXT).guide()["quiz_pool"], 10)
+
+
+def lazy_mock_fallback():
+    FallbackEngine("Google", CONTEXT).sample_quiz(10)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    cases = [
+        ("tech extraction", lambda: legacy_tech_scan(CONTEXT), lambda: extract_tech_stack(CONTEXT)),
+        ("/get-interview-data (AI ok)", eager_interview_data, lazy_interview_data),
+        ("/generate-mock-test top-up (10)", eager_mock_fallback, lazy_mock_fallback),
+    ]
+    for label, before, after in cases:
+        t_before = timeit.timeit(before, number=n) / n * 1e6
+        t_after = timeit.timeit(after, number=n) / n * 1e6
+        print(f"{label:<34} before {t_before:8.1f} us  after {t_after:8.1f} us  saved {t_before - t_after:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
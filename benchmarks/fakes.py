@@ -0,0 +1,211 @@
+"""
+Offline stand-ins for Gemini and DuckDuckGo, shared by the benchmarks.
+
+    fakes.install(FakeConfig(latency_ms=400, rate_limit_rate=0.05))
+
+replaces the Gemini SDK (as seen by ai_service) and `DDGS` (as seen by
+search_service) so no quota is spent, no network is touched and the real SDKs
+are never imported. Responses
+are shaped after the prompts server.py sends, so the real parsing,
+validation and fallback paths run.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: float = 400.0       # median Gemini latency
+    latency_sigma: float = 0.5      # log-normal spread; 0 gives a fixed latency
+    rate_limit_rate: float = 0.0    # fraction of Gemini calls that fail with a 429
+    malformed_rate: float = 0.0     # fraction of responses truncated mid-JSON
+    search_latency_ms: float = 150.0
+    search_rate_limit_rate: float = 0.0  # fraction of DDGS queries answered with a rate limit
+    search_results: int = 10        # results per DDGS query (capped by max_results)
+    seed: int = 7
+
+
+class FakeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"gemini_calls": 0, "rate_limited": 0, "malformed": 0, "ddgs_sessions": 0, "ddgs_queries": 0,
+                       "ddgs_rate_limited": 0}
+
+    def inc(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeStream:
+    def __init__(self, text, delay):
+        self._chunks = [text[i:i + 40] for i in range(0, len(text), 40)]
+        self._delay = delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield FakeResponse(chunk)
+
+
+def _latency(config: FakeConfig, rng: random.Random, median_ms: float):
+    if config.latency_sigma <= 0:
+        return median_ms / 1000
+    return rng.lognormvariate(0, config.latency_sigma) * median_ms / 1000
+
+
+def _questions(n, prefix):
+    return [{"question": f"{prefix} question {i}: explain a trade-off", "category": "DSA", "tip": "Be concrete"}
+            for i in range(n)]
+
+
+_TOPICS = ["sharding", "consensus", "rate limiting", "cache invalidation", "backpressure", "idempotency",
+           "schema migrations", "leader election", "bloom filters", "write amplification", "tail latency",
+           "feature flags", "blue-green deploys", "vector clocks", "garbage collection", "connection pooling"]
+
+
+def _more_questions(n, rng):
+    return [{"question": f"How would you approach {a} together with {b} for workload #{rng.randint(0, 10 ** 6)}?",
+             "category": "System Design", "tip": "State the trade-off"}
+            for a, b in (rng.sample(_TOPICS, 2) for _ in range(n))]
+
+
+def _quiz(n, seed):
+    categories = ["DSA", "Tech Stack", "System Design", "Engineering Principles"]
+    return [{
+        "category": categories[i % 4],
+        "question": f"Variant {seed}-{i}: which structure gives O(log n) lookups for case {i * 7 + seed}?",
+        "options": ["Hash map", "Balanced BST", "Linked list", "Stack"],
+        "correct_answer": 1,
+        "explanation": "Balanced trees keep height logarithmic.",
+    } for i in range(n)]
+
+
+def fake_reply(prompt: str, rng: random.Random) -> str:
+    """Plausible JSON/text for whichever server.py prompt this is."""
+    if "RESUME CONTENT" in prompt:
+        score = rng.randint(55, 92)
+        return json.dumps({"score": score, "ats_score": score, "grade": "B+", "summary": "Solid resume.",
+                           "strengths": ["Metrics"], "improvements": ["More impact"],
+                           "keywords_found": ["Python"], "missing_keywords": ["Kubernetes"],
+                           "section_scores": {"experience": 7, "skills": 8},
+                           "industry_benchmark": "Average candidate pool", "recommended_roles": ["Backend Engineer"]})
+    if "'quiz'" in prompt or '"quiz"' in prompt:
+        return json.dumps({"quiz": _quiz(40, zlib.crc32(prompt.encode()) + rng.randint(0, 10 ** 6))})
+    if "MORE" in prompt:
+        return json.dumps({"questions": _more_questions(40, rng)})
+    if "interview preparation guide" in prompt:
+        return json.dumps({
+            "company_overview": "A fast-growing engineering organisation.",
+            "rounds": [{"name": f"Round {i}", "description": "Technical"} for i in range(1, 5)],
+            "questions": _questions(15, "Guide"),
+            "roadmap": [{"week": f"Week {i}", "focus": "Topic", "details": "Practice"} for i in range(1, 5)],
+        })
+    return "Focus on fundamentals, practise timed problems and review system design basics."
+
+
+def make_fake_model(config: FakeConfig, stats: FakeStats):
+    rng = random.Random(config.seed)
+
+    class FakeModel:
+        def __init__(self, model_name, *args, **kwargs):
+            self.model_name = model_name
+
+        async def generate_content_async(self, prompt, stream=False, **kwargs):
+            stats.inc("gemini_calls")
+            await asyncio.sleep(_latency(config, rng, config.latency_ms))
+            if rng.random() < config.rate_limit_rate:
+                stats.inc("rate_limited")
+                raise Exception("429 Resource has been exhausted (fake)")
+            text = fake_reply(prompt, rng)
+            if rng.random() < config.malformed_rate:
+                stats.inc("malformed")
+                text = text[:int(len(text) * rng.uniform(0.3, 0.9))]
+            if stream:
+                return _FakeStream(text, 0.005)
+            return FakeResponse(text)
+
+    return FakeModel
+
+
+def make_fake_ddgs(config: FakeConfig, stats: FakeStats):
+    rng = random.Random(config.seed + 1)
+    lock = threading.Lock()
+
+    class FakeDDGS:
+        def __init__(self, *args, **kwargs):
+            stats.inc("ddgs_sessions")
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def text(self, query, max_results=10, **kwargs):
+            stats.inc("ddgs_queries")
+            with lock:
+                delay = _latency(config, rng, config.search_latency_ms)
+                rate_limited = rng.random() < config.search_rate_limit_rate
+            time.sleep(delay)
+            if rate_limited:
+                stats.inc("ddgs_rate_limited")
+                raise Exception("https://html.duckduckgo.com/html 202 Ratelimit (fake)")
+            return [{
+                "title": f"{query[:40]} result {i}",
+                "href": f"https://example.com/{zlib.crc32(query.encode())}/{i}",
+                "body": f"Result {i} for {query}: interview rounds cover DSA, Python, Kubernetes and system design. "
+                        f"Candidate {i} reports {i + 2} rounds and a take-home.",
+            } for i in range(min(config.search_results, max_results))]
+
+    return FakeDDGS
+
+
+def install(config: FakeConfig = None):
+    """Patches ai_service and search_service in place. Returns the shared FakeStats."""
+    import ai_service
+    import search_service
+
+    config = config or FakeConfig()
+    stats = FakeStats()
+    ai_service.genai = SimpleNamespace(GenerativeModel=make_fake_model(config, stats), configure=lambda **kwargs: None)
+    search_service.DDGS = make_fake_ddgs(config, stats)
+    return stats
+
+
+def sample_pdf(text: str) -> bytes:
+    """A minimal single-page PDF whose text layer is `text` (one line per 80 chars)."""
+    lines = [text[i:i + 80] for i in range(0, len(text), 80)] or [""]
+    escaped = [l.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for l in lines]
+    content = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(f"({l}) '" for l in escaped) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
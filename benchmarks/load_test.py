@@ -0,0 +1,243 @@
+"""
+Offline load test: drives every API route in-process against fake Gemini and
+DuckDuckGo backends at rising concurrency.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --concurrency 1,8,32 --requests 60 --latency-ms 600 \
+        --rate-limit-rate 0.05 --malformed-rate 0.1
+    python benchmarks/load_test.py --compare benchmarks/results/<older>.json
+
+For each (route, concurrency) level it reports throughput, p50/p95/p99
+latency, error count and event-loop lag (how late a 10 ms ticker wakes up
+while the level runs). Results are written as JSON, tagged with the current
+git commit, so two runs can be compared with --compare.
+
+Requests go through httpx's ASGI transport straight into the app, with the
+app's lifespan running, so no server process or port is needed. Caches live
+in a throwaway directory; each level uses its own company names and PDFs, so
+levels start equally cold. The Gemini quota is set high (--ai-rpm/--ai-tpm)
+so the run measures the app rather than the admission throttle; pass the real
+budgets to see how the quota shapes latency.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = ["get-interview-data", "generate-mock-test", "fetch-more-questions", "ask-ai", "score-resume"]
+COMPANIES = ["Google", "Amazon", "Microsoft", "Meta", "Stripe", "Netflix", "Uber", "Atlassian", "Infosys", "TCS"]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LoopLagMonitor:
+    """Samples how late a periodic sleep wakes up; large values mean something blocked the loop."""
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return {
+            "p50_ms": round(percentile(self.samples, 50) * 1000, 2),
+            "p99_ms": round(percentile(self.samples, 99) * 1000, 2),
+            "max_ms": round(max(self.samples, default=0.0) * 1000, 2),
+        }
+
+
+def build_request(route: str, level: int, index: int, pool: int, pdfs: dict):
+    company = f"{COMPANIES[index % len(COMPANIES)]} L{level}-{index % pool}"
+    if route == "score-resume":
+        key = (level, index % pool)
+        if key not in pdfs:
+            from fakes import sample_pdf
+            pdfs[key] = sample_pdf(f"Candidate {key} - Python, Kubernetes, led a team of {key[1] + 3}. " * 30)
+        return {"files": {"file": ("resume.pdf", pdfs[key], "application/pdf")}}
+    if route == "ask-ai":
+        return {"json": {"query": f"How should I prepare for {company} system design?"}}
+    if route == "generate-mock-test":
+        return {"json": {"name": company, "user_id": f"bench-{index}"}}
+    return {"json": {"name": company}}
+
+
+async def run_level(client, route: str, concurrency: int, total: int, pool: int, pdfs: dict):
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            index = queue.get_nowait()
+            kwargs = build_request(route, concurrency, index, pool, pdfs)
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"/{route}", **kwargs)
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    lag = await monitor.stop()
+    return {
+        "route": route,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "loop_lag": lag,
+    }
+
+
+async def run(args, config):
+    import httpx
+    import fakes
+
+    fake_stats = fakes.install(config)
+    import server
+
+    if not args.verbose:
+        # The app logs every request and model attempt; keep them out of the report unless asked
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        logging.getLogger("careerflow").setLevel(logging.WARNING)
+    results = []
+    pdfs = {}
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.lifespan(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for route in args.routes:
+                for concurrency in args.concurrency:
+                    result = await run_level(client, route, concurrency, args.requests, args.pool, pdfs)
+                    results.append(result)
+                    print(f"{route:>22} c={concurrency:<3} {result['throughput_rps']:>7.1f} req/s  "
+                          f"p50={result['p50_ms']:>8.1f}ms p95={result['p95_ms']:>8.1f}ms "
+                          f"p99={result['p99_ms']:>8.1f}ms errors={result['errors']:<3} "
+                          f"loop lag p99={result['loop_lag']['p99_ms']}ms max={result['loop_lag']['max_ms']}ms")
+    return results, dict(fake_stats.counts), server.ai_engine.snapshot()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(baseline_path: str, current: list):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r["route"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\nvs {baseline.get('commit')} ({baseline_path}):")
+    for r in current:
+        old = before.get((r["route"], r["concurrency"]))
+        if not old:
+            continue
+        p95 = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+        rps = (r["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100 if old["throughput_rps"] else 0.0
+        print(f"{r['route']:>22} c={r['concurrency']:<3} throughput {rps:+6.1f}%  p95 {p95:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test against fake Gemini/DuckDuckGo")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="comma-separated subset of " + ",".join(ROUTES))
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="requests per route per level")
+    parser.add_argument("--pool", type=int, default=10, help="distinct companies/resumes per level (controls cache reuse)")
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="median fake Gemini latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of Gemini latency")
+    parser.add_argument("--search-latency-ms", type=float, default=150.0)
+    parser.add_argument("--search-results", type=int, default=10)
+    parser.add_argument("--search-rate-limit-rate", type=float, default=0.0,
+                        help="fraction of DDGS queries answered with a rate limit")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of Gemini calls returning 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of Gemini replies truncated mid-JSON")
+    parser.add_argument("--ai-rpm", type=float, default=100000.0,
+                        help="per-model Gemini requests per minute (AI_RPM); the app default is 60")
+    parser.add_argument("--ai-tpm", type=float, default=1e9, help="per-model Gemini tokens per minute (AI_TPM)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="results file (default benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own request logs")
+    args = parser.parse_args()
+    args.routes = [r.strip().strip("/") for r in args.routes.split(",") if r.strip()]
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+
+    # Isolated caches and no background pre-generation, before server is imported
+    os.environ["CAREERFLOW_CACHE_DIR"] = tempfile.mkdtemp(prefix="careerflow-bench-")
+    os.environ.pop("PREWARM_ENABLED", None)
+    os.environ["AI_RPM"] = str(args.ai_rpm)
+    os.environ.pop("AI_QUOTAS", None)
+    os.environ["AI_TPM"] = str(args.ai_tpm)
+
+    import fakes
+    config = fakes.FakeConfig(
+        latency_ms=args.latency_ms, latency_sigma=args.latency_sigma, rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate, search_latency_ms=args.search_latency_ms,
+        search_rate_limit_rate=args.search_rate_limit_rate, search_results=args.search_results, seed=args.seed,
+    )
+    results, fake_counts, ai_stats = asyncio.run(run(args, config))
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.time(),
+        "config": {**vars(config), "requests": args.requests, "pool": args.pool, "ai_rpm": args.ai_rpm,
+                   "ai_tpm": args.ai_tpm},
+        "results": results,
+        "fake_backends": fake_counts,
+        "ai_engine": ai_stats,
+    }
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"{commit}-{int(time.time())}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {out}")
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
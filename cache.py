@@ -0,0 +1,358 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import CACHE_LOOKUPS, log_event
+from shared_state import after_fork, shared_state
+
+CACHE_DIR = os.getenv("CAREERFLOW_CACHE_DIR", ".cache")
+# Hit timestamps (for LRU eviction of the SQLite tier) are written in batches, not one commit per hit
+CACHE_ACCESS_BATCH = int(os.getenv("CACHE_ACCESS_BATCH", "64"))
+CACHE_ACCESS_FLUSH_INTERVAL = float(os.getenv("CACHE_ACCESS_FLUSH_INTERVAL", "5"))
+
+
+def normalize_key(text: str) -> str:
+    """Case- and whitespace-insensitive cache key."""
+    return " ".join((text or "").lower().split())
+
+
+def open_sqlite(path: str):
+    """Connection tuned for several worker processes sharing one file."""
+    db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+    db.execute("PRAGMA journal_mode=WAL")
+    return db
+
+
+def canonical_company(name: str) -> str:
+    """'Google, Inc.' / ' google ' / 'GOOGLE LLC' -> 'google'"""
+    text = re.sub(r"[^a-z0-9+#& ]", " ", (name or "").lower())
+    words = text.split()
+    while len(words) > 1 and words[-1] in ("inc", "llc", "ltd", "corp", "corporation", "co", "plc", "limited"):
+        words.pop()
+    return " ".join(words)
+
+
+class PersistentTTLCache:
+    """
+    Size-bounded LRU with a TTL, backed by a local SQLite table so entries
+    survive restarts. Values must be JSON-serializable.
+
+    Reads hit the in-memory LRU first and fall through to SQLite; expired
+    entries are treated as misses and removed lazily. Hits record their
+    access time in memory and flush it to SQLite in batches; the table is
+    only trimmed (least recently accessed first, down to 90% of the cap)
+    once it actually holds more than max_entries rows. When the shared state
+    backend is remote (Redis), it replaces SQLite as the second tier so all
+    workers on all hosts share entries; code on the event loop uses the async
+    twins (aget / apeek / aset), which make that round trip in a thread and
+    never under the lock.
+    """
+    def __init__(self, name: str, ttl: float, max_entries: int = 1000, path: str = None, store=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path or os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.row_evictions = 0
+        self._touched = {}
+        self._next_flush = time.time() + CACHE_ACCESS_FLUSH_INTERVAL
+        self._rows = 0
+        self._db = None
+        self.store = store if store is not None else (shared_state if shared_state.remote else None)
+        after_fork(self._after_fork)
+        if self.store is not None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = open_sqlite(self.path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._db.commit()
+            self._rows = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except sqlite3.Error as e:
+            # Degrade to memory-only rather than failing requests
+            log_event("cache_persistence_disabled", cache=self.name, error=str(e))
+            self._db = None
+
+    def _after_fork(self):
+        # SQLite connections and held locks must not cross a fork
+        self._lock = threading.Lock()
+        self._touched = {}
+        if self._db is not None:
+            self._db = open_sqlite(self.path)
+
+    def _store_key(self, key: str):
+        return f"cache:{self.name}:{key}"
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl
+
+    def get(self, key: str):
+        return self._lookup(key, True, self._fetch(key))
+
+    def peek(self, key: str):
+        """Like get(), but leaves hit/miss counters and recency untouched (for status pages)."""
+        return self._lookup(key, False, self._fetch(key))
+
+    async def aget(self, key: str):
+        return self._lookup(key, True, await self._afetch(key))
+
+    async def apeek(self, key: str):
+        return self._lookup(key, False, await self._afetch(key))
+
+    def _fetch(self, key: str):
+        # Remote tier only, and only on a memory miss; SQLite is read under the lock in _lookup
+        if self.store is None or key in self._memory:
+            return None
+        return self.store.get(self._store_key(key))
+
+    async def _afetch(self, key: str):
+        if self.store is None or key in self._memory:
+            return None
+        return await self.store.aget(self._store_key(key))
+
+    def _lookup(self, key: str, count: bool, stored):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and stored is not None:
+                entry = (stored[0], stored[1])
+                self._remember(key, entry)
+            elif entry is None and self._db is not None:
+                row = self._db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+                if row:
+                    entry = (json.loads(row[0]), row[1])
+                    self._remember(key, entry)
+            if entry is None or self._expired(entry[1]):
+                if entry is not None:
+                    self._delete(key)
+                if count:
+                    self.misses += 1
+                    CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+                return None
+            if count:
+                self._memory.move_to_end(key)
+                if self._db is not None:
+                    self._touch(key)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+            return entry[0]
+
+    def set(self, key: str, value):
+        stored = self._set_local(key, value)
+        if self.store is not None:
+            self.store.set(self._store_key(key), stored, ttl=self.ttl)
+
+    async def aset(self, key: str, value):
+        stored = self._set_local(key, value)
+        if self.store is not None:
+            await self.store.aset(self._store_key(key), stored, ttl=self.ttl)
+
+    def _set_local(self, key: str, value):
+        # Memory and SQLite tiers; returns the [value, created] pair for a remote tier
+        now = time.time()
+        with self._lock:
+            self._remember(key, (value, now))
+            if self.store is None and self._db is not None:
+                self._touched.pop(key, None)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now)
+                )
+                self._rows += 1
+                if self._rows > self.max_entries:
+                    self._trim()
+                self._db.commit()
+        return [value, now]
+
+    def _touch(self, key):
+        self._touched[key] = time.time()
+        if len(self._touched) >= CACHE_ACCESS_BATCH or time.time() >= self._next_flush:
+            self._flush_access()
+
+    def _flush_access(self):
+        self._next_flush = time.time() + CACHE_ACCESS_FLUSH_INTERVAL
+        if not self._touched:
+            return
+        self._db.executemany(
+            "UPDATE entries SET accessed = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()]
+        )
+        self._db.commit()
+        self._touched = {}
+
+    def _trim(self):
+        # _rows also counts replaced keys and misses other workers' writes; only the real count decides
+        self._flush_access()
+        self._rows = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if self._rows <= self.max_entries:
+            return
+        # Down to 90% of the cap, so the next trim is a while away
+        excess = self._rows - self.max_entries * 9 // 10
+        self._db.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)", (excess,)
+        )
+        self._rows -= excess
+        self.row_evictions += excess
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _delete(self, key):
+        # A remote entry carries the same TTL and expires there on its own
+        self._memory.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched = {}
+            if self._db is not None:
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
+                self._rows = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "row_evictions": self.row_evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+        }
+
+
+class StaleWhileRevalidateCache:
+    """
+    Result cache with single-flight coalescing and stale-while-revalidate.
+
+    - Fresh entry (younger than soft_ttl): returned immediately.
+    - Stale entry (older than soft_ttl, younger than its hard expiry): returned
+      immediately while one background refresh recomputes it.
+    - Missing/expired entry: concurrent callers for the same key share one
+      in-flight computation.
+
+    `compute` is an async callable returning `(value, ttl_override)`. A non-None
+    ttl_override caps both the soft and hard TTL for that entry, e.g. so a
+    degraded result is recomputed quickly instead of being pinned. Such a
+    result never replaces an entry that has not expired yet; that entry is
+    instead treated as fresh for another ttl_override seconds.
+    """
+    def __init__(self, name: str, soft_ttl: float, hard_ttl: float, max_entries: int = 500, path: str = None):
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.store = PersistentTTLCache(name, ttl=hard_ttl, max_entries=max_entries, path=path)
+        self._inflight = {}
+        self._background = set()
+        self.coalesced = 0
+        self.stale_served = 0
+        self.refreshes = 0
+        self.computations = 0
+        self.degraded_kept = 0
+
+    async def get_or_compute(self, key: str, compute):
+        entry = await self.store.aget(key)
+        now = time.time()
+        if entry is not None and now < entry["expires_at"]:
+            if now >= entry["fresh_until"]:
+                self.stale_served += 1
+                self._refresh_in_background(key, compute)
+            return entry["value"]
+        return await self._single_flight(key, compute)
+
+    async def peek(self, key: str):
+        """Returns the cached value (fresh or stale) without triggering any computation."""
+        entry = await self.store.aget(key)
+        if entry is not None and time.time() < entry["expires_at"]:
+            return entry["value"]
+        return None
+
+    def entry(self, key: str):
+        """Raw entry with its timestamps, for staleness reporting."""
+        return self.store.peek(key)
+
+    async def aentry(self, key: str):
+        return await self.store.apeek(key)
+
+    async def put(self, key: str, value, ttl_override: float = None):
+        now = time.time()
+        soft = min(self.soft_ttl, ttl_override) if ttl_override is not None else self.soft_ttl
+        hard = min(self.hard_ttl, ttl_override) if ttl_override is not None else self.hard_ttl
+        await self.store.aset(
+            key, {"value": value, "stored_at": now, "fresh_until": now + soft, "expires_at": now + hard}
+        )
+
+    async def _single_flight(self, key: str, compute):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute_and_store(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one caller disconnecting does not cancel the shared work
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(self, key: str, compute):
+        self.computations += 1
+        value, ttl_override = await compute()
+        if ttl_override is not None:
+            # A degraded refresh keeps serving the last good entry until it expires, and the
+            # next refresh waits ttl_override instead of firing on every request for the key
+            entry = await self.store.apeek(key)
+            now = time.time()
+            if entry is not None and now < entry["expires_at"]:
+                self.degraded_kept += 1
+                entry["fresh_until"] = min(now + ttl_override, entry["expires_at"])
+                await self.store.aset(key, entry)
+                return entry["value"]
+        await self.put(key, value, ttl_override)
+        return value
+
+    def _refresh_in_background(self, key: str, compute):
+        if key in self._inflight:
+            return
+        self.refreshes += 1
+
+        async def refresh():
+            try:
+                await self._single_flight(key, compute)
+            except Exception as e:
+                log_event("cache_refresh_failed", key=key, error=str(e))
+
+        task = asyncio.ensure_future(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def stats(self):
+        stats = self.store.stats()
+        stats.update({
+            "soft_ttl": self.soft_ttl,
+            "computations": self.computations,
+            "coalesced": self.coalesced,
+            "stale_served": self.stale_served,
+            "background_refreshes": self.refreshes,
+            "degraded_kept": self.degraded_kept,
+            "in_flight": len(self._inflight),
+        })
+        return stats
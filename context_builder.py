@@ -0,0 +1,131 @@
+import math
+import os
+import re
+import time
+from collections import Counter
+
+# --- RAG CONTEXT BUILDER (BM25 ranking, near-duplicate removal, token budgets) ---
+
+# Rough prompt-token budgets per endpoint (1 token ~ 4 characters of English)
+CONTEXT_BUDGETS = {
+    "guide": int(os.getenv("CONTEXT_BUDGET_GUIDE", "300")),
+    "mock_test": int(os.getenv("CONTEXT_BUDGET_MOCK_TEST", "700")),
+    "ask": int(os.getenv("CONTEXT_BUDGET_ASK", "500")),
+}
+NEAR_DUPLICATE_THRESHOLD = 0.7
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it", "of",
+    "on", "or", "that", "the", "this", "to", "was", "what", "which", "with", "you", "your",
+}
+
+# Per-endpoint totals so prompt size can be compared before and after packing
+_stats = {}
+
+
+def tokenize(text: str):
+    return [w.rstrip(".") for w in _WORD.findall((text or "").lower()) if w not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+def bm25_scores(query_terms, documents, k1: float = 1.5, b: float = 0.75):
+    """BM25 score of each tokenized document against the query, with IDF over `documents`."""
+    n = len(documents)
+    if not n:
+        return []
+    avg_len = sum(len(d) for d in documents) / n or 1.0
+    df = Counter(term for d in documents for term in set(d))
+    scores = []
+    for doc in documents:
+        tf = Counter(doc)
+        score = 0.0
+        for term in set(query_terms):
+            if term not in tf:
+                continue
+            idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+            freq = tf[term]
+            score += idf * freq * (k1 + 1) / (freq + k1 * (1 - b + b * len(doc) / avg_len))
+        scores.append(score)
+    return scores
+
+
+def shingle_set(terms, size: int = 3):
+    """Word n-gram set used for near-duplicate detection."""
+    if len(terms) < size:
+        return {" ".join(terms)}
+    return {" ".join(terms[i:i + size]) for i in range(len(terms) - size + 1)}
+
+
+def is_near_duplicate(shingles, kept, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+    for other in kept:
+        union = len(shingles | other)
+        if union and len(shingles & other) / union >= threshold:
+            return True
+    return False
+
+
+def build_context(query: str, results, endpoint: str, budget_tokens: int = None):
+    """
+    Ranks search results against the query, drops near-duplicate snippets and
+    packs the best ones into the endpoint's token budget.
+
+    Returns (context_text, snippets) where snippets keep title/link/score for
+    citations, in rank order.
+    """
+    started = time.perf_counter()
+    budget = budget_tokens or CONTEXT_BUDGETS.get(endpoint, 500)
+    candidates = [r for r in results if (r.get("body") or "").strip()]
+    documents = [tokenize(r.get("title", "") + " " + r["body"]) for r in candidates]
+    scores = bm25_scores(tokenize(query), documents)
+    ranked = sorted(zip(scores, range(len(candidates))), key=lambda x: (-x[0], x[1]))
+
+    snippets, kept_shingles, seen_links = [], [], set()
+    used = duplicates = 0
+    for score, index in ranked:
+        result = candidates[index]
+        link = result.get("link", "")
+        # Titles are often rewritten per site; compare bodies only
+        shingles = shingle_set(tokenize(result["body"]))
+        if (link and link in seen_links) or is_near_duplicate(shingles, kept_shingles):
+            duplicates += 1
+            continue
+        body = result["body"].strip()
+        cost = estimate_tokens(body)
+        if used + cost > budget:
+            if snippets:
+                continue
+            # Nothing fits yet: keep a truncated top snippet rather than no context
+            body = body[:budget * 4]
+            cost = estimate_tokens(body)
+        snippets.append({"title": result.get("title", ""), "link": link, "body": body, "score": round(score, 3)})
+        kept_shingles.append(shingles)
+        seen_links.add(link)
+        used += cost
+
+    context = "\n".join(s["body"] for s in snippets)
+    stat = _stats.setdefault(endpoint, {"calls": 0, "tokens_in": 0, "tokens_out": 0, "dropped_duplicates": 0, "build_ms": 0.0})
+    stat["calls"] += 1
+    stat["tokens_in"] += sum(estimate_tokens(r["body"]) for r in candidates)
+    stat["tokens_out"] += estimate_tokens(context)
+    stat["dropped_duplicates"] += duplicates
+    stat["build_ms"] += (time.perf_counter() - started) * 1000
+    return context, snippets
+
+
+def context_stats():
+    report = {}
+    for endpoint, stat in _stats.items():
+        calls = stat["calls"] or 1
+        report[endpoint] = {
+            "calls": stat["calls"],
+            "avg_candidate_tokens": round(stat["tokens_in"] / calls, 1),
+            "avg_context_tokens": round(stat["tokens_out"] / calls, 1),
+            "dropped_duplicates": stat["dropped_duplicates"],
+            "budget": CONTEXT_BUDGETS.get(endpoint),
+            "avg_build_ms": round(stat["build_ms"] / calls, 3),
+        }
+    return report
@@ -75,6 +75,7 @@ function App() {
     const [userAnswers, setUserAnswers] = useState({});
     const [expandedQuestionIndex, setExpandedQuestionIndex] = useState(null);
     const [loadingMore, setLoadingMore] = useState(false);
+    const [questionCursor, setQuestionCursor] = useState(null);
     const [isRequestModalOpen, setIsRequestModalOpen] = useState(false);
     const [requestInput, setRequestInput] = useState('');
 
@@ -142,6 +143,7 @@ function App() {
                 setError(res.data.error);
             } else {
                 setData(res.data);
+                setQuestionCursor(null);
                 setActiveTab('process');
             }
         } catch (err) {
@@ -158,8 +160,10 @@ function App() {
             const existing = data.questions.map(q => q.question);
             const res = await axios.post(`${API_BASE_URL}/fetch-more-questions`, {
                 name: selectedCompany,
+                cursor: questionCursor,
                 existing: existing
             });
+            setQuestionCursor(res.data.cursor);
 
             // Client-side safety filter
             const newUniqueQuestions = res.data.questions.filter(
@@ -180,7 +184,7 @@ function App() {
         setLoading(true);
         setUserAnswers({});
         try {
-            const res = await axios.post(`${API_BASE_URL}/generate-mock-test`, { name: selectedCompany });
+            const res = await axios.post(`${API_BASE_URL}/generate-mock-test`, { name: selectedCompany, user_id: user?.uid });
             setMockTest(res.data.quiz);
             setActiveTab('mock');
         } catch (err) {
@@ -0,0 +1,224 @@
+import math
+import os
+import threading
+import time
+from collections import Counter as TermCounts
+from urllib.parse import urlsplit, urlunsplit
+
+from cache import CACHE_DIR, open_sqlite
+from context_builder import tokenize
+from metrics import Counter, Gauge, span
+from shared_state import after_fork
+
+# --- LOCAL KNOWLEDGE BASE (inverted index over every fetched search snippet, BM25) ---
+
+KB_MAX_DOCS = int(os.getenv("KB_MAX_DOCS", "50000"))
+# A snippet older than this no longer counts towards answering locally
+KB_MAX_AGE = float(os.getenv("KB_MAX_AGE", str(7 * 24 * 3600)))
+# Share of the question's terms the top hits must contain, and how many fresh hits are needed
+KB_MIN_COVERAGE = float(os.getenv("KB_MIN_COVERAGE", "0.8"))
+KB_MIN_RESULTS = int(os.getenv("KB_MIN_RESULTS", "4"))
+KB_TOP_K = 12
+
+KB_LOOKUPS = Counter("careerflow_kb_lookups_total", "Questions answered from the local index vs a web search", ("source",))
+KB_DOCUMENTS = Gauge("careerflow_kb_documents", "Snippets in the local knowledge base")
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit((url or "").strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
+
+
+class KnowledgeBase:
+    """
+    SQLite inverted index over search snippets, one document per URL.
+    Postings hold per-term frequencies; document count, total length and
+    distinct term count are kept in a meta row so neither BM25 nor the stats
+    need a table scan. Re-fetching a URL
+    refreshes its timestamp (and postings, if the snippet changed).
+    """
+    def __init__(self, path: str = None, max_docs: int = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path or os.path.join(CACHE_DIR, "knowledge_base.sqlite3")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.max_docs = max_docs or KB_MAX_DOCS
+        self.k1, self.b = k1, b
+        self._db = open_sqlite(self.path)
+        self._lock = threading.Lock()
+        after_fork(self._after_fork)
+        self.stats = {"indexed": 0, "refreshed": 0, "evicted": 0, "queries": 0, "query_seconds": 0.0,
+                      "local": 0, "web": 0}
+        with self._lock:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS doc (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL UNIQUE,
+                    title TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    length INTEGER NOT NULL,
+                    fetched REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS doc_fetched ON doc (fetched);
+                CREATE TABLE IF NOT EXISTS posting (
+                    term TEXT NOT NULL,
+                    doc_id INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, doc_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS posting_doc ON posting (doc_id);
+                CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 0), docs INTEGER, total_length INTEGER,
+                                                 terms INTEGER);
+            """)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(meta)")]
+            if "terms" not in columns:
+                # Index built before the term count was kept: count once, then maintain it
+                self._db.execute("ALTER TABLE meta ADD COLUMN terms INTEGER")
+                self._db.execute("UPDATE meta SET terms = (SELECT COUNT(DISTINCT term) FROM posting) WHERE id = 0")
+            self._db.execute("INSERT OR IGNORE INTO meta (id, docs, total_length, terms) VALUES (0, 0, 0, 0)")
+            self._db.commit()
+        KB_DOCUMENTS.set(self._totals()[0])
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._db = open_sqlite(self.path)
+
+    def _totals(self):
+        return self._db.execute("SELECT docs, total_length FROM meta WHERE id = 0").fetchone()
+
+    def _indexed_terms(self, terms):
+        # Which of `terms` have at least one posting (PRIMARY KEY lookups, in SQLite-sized batches)
+        found = set()
+        for start in range(0, len(terms), 500):
+            batch = terms[start:start + 500]
+            found.update(row[0] for row in self._db.execute(
+                f"SELECT DISTINCT term FROM posting WHERE term IN ({','.join('?' * len(batch))})", batch
+            ))
+        return found
+
+    def _remove(self, doc_id: int, length: int):
+        terms = [row[0] for row in self._db.execute("SELECT term FROM posting WHERE doc_id = ?", (doc_id,))]
+        self._db.execute("DELETE FROM posting WHERE doc_id = ?", (doc_id,))
+        self._db.execute("DELETE FROM doc WHERE id = ?", (doc_id,))
+        # Terms whose last posting just went
+        gone = len(terms) - len(self._indexed_terms(terms))
+        self._db.execute("UPDATE meta SET docs = docs - 1, total_length = total_length - ?, terms = terms - ? "
+                         "WHERE id = 0", (length, gone))
+
+    def add(self, results):
+        """Indexes raw DDGS result dicts (title/body/href). Returns how many were new or changed."""
+        now = time.time()
+        changed = 0
+        with self._lock:
+            for r in results:
+                url = normalize_url(r.get("href") or r.get("link") or "")
+                title, body = r.get("title") or "", r.get("body") or ""
+                if not url or not body:
+                    continue
+                row = self._db.execute("SELECT id, body, length FROM doc WHERE url = ?", (url,)).fetchone()
+                if row is not None and row[1] == body:
+                    self._db.execute("UPDATE doc SET fetched = ? WHERE id = ?", (now, row[0]))
+                    self.stats["refreshed"] += 1
+                    continue
+                if row is not None:
+                    self._remove(row[0], row[2])
+                terms = TermCounts(tokenize(f"{title} {body}"))
+                length = sum(terms.values())
+                new_terms = len(terms) - len(self._indexed_terms(list(terms)))
+                doc_id = self._db.execute(
+                    "INSERT INTO doc (url, title, body, length, fetched) VALUES (?, ?, ?, ?, ?)",
+                    (url, title, body, length, now)
+                ).lastrowid
+                self._db.executemany(
+                    "INSERT INTO posting (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, doc_id, tf) for term, tf in terms.items()]
+                )
+                self._db.execute("UPDATE meta SET docs = docs + 1, total_length = total_length + ?, terms = terms + ? "
+                                 "WHERE id = 0", (length, new_terms))
+                changed += 1
+            docs = self._totals()[0]
+            if docs > self.max_docs:
+                # Evict the least recently fetched tenth in one go
+                for doc_id, length in self._db.execute(
+                    "SELECT id, length FROM doc ORDER BY fetched LIMIT ?", (docs - self.max_docs + self.max_docs // 10,)
+                ).fetchall():
+                    self._remove(doc_id, length)
+                    self.stats["evicted"] += 1
+                docs = self._totals()[0]
+            self._db.commit()
+        self.stats["indexed"] += changed
+        KB_DOCUMENTS.set(docs)
+        return changed
+
+    def search(self, query: str, limit: int = KB_TOP_K, max_age: float = None):
+        """
+        BM25 over the whole index, keeping only snippets fetched within
+        `max_age`. Returns {"results": [{title, body, link}], "coverage": share
+        of query terms found in those results}.
+        """
+        max_age = KB_MAX_AGE if max_age is None else max_age
+        terms = list(dict.fromkeys(tokenize(query)))[:32]
+        if not terms:
+            return {"results": [], "coverage": 0.0}
+        started = time.perf_counter()
+        with span("kb_query"), self._lock:
+            n, total_length = self._totals()
+            # Stale snippets are dropped in SQL (doc_fetched index), not loaded and skipped
+            rows = self._db.execute(
+                f"SELECT p.term, p.doc_id, p.tf, d.length FROM posting p JOIN doc d ON d.id = p.doc_id "
+                f"WHERE p.term IN ({','.join('?' * len(terms))}) AND d.fetched >= ?", [*terms, time.time() - max_age]
+            ).fetchall()
+            avg_len = total_length / n if n else 1.0
+            # df counts fresh documents only; close enough for ranking
+            df = TermCounts(row[0] for row in rows)
+            scores, matched = {}, {}
+            for term, doc_id, tf, length in rows:
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                score = idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / (avg_len or 1.0)))
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+                matched.setdefault(doc_id, set()).add(term)
+            top = sorted(scores, key=scores.get, reverse=True)[:limit]
+            docs = {}
+            if top:
+                docs = {row[0]: row[1:] for row in self._db.execute(
+                    f"SELECT id, title, body, url FROM doc WHERE id IN ({','.join('?' * len(top))})", top
+                )}
+        self.stats["queries"] += 1
+        self.stats["query_seconds"] += time.perf_counter() - started
+        covered = set().union(*(matched[d] for d in top)) if top else set()
+        return {
+            "results": [{"title": docs[d][0], "body": docs[d][1], "link": docs[d][2]} for d in top if d in docs],
+            "coverage": len(covered) / len(terms),
+        }
+
+    def answer_locally(self, query: str):
+        """
+        Fresh snippets for `query` if the index covers it well enough
+        (KB_MIN_COVERAGE of its terms, at least KB_MIN_RESULTS fresh hits),
+        else None so the caller searches the web. Counts either outcome.
+        """
+        hits = self.search(query)
+        if hits["coverage"] >= KB_MIN_COVERAGE and len(hits["results"]) >= KB_MIN_RESULTS:
+            self.stats["local"] += 1
+            KB_LOOKUPS.inc(source="local")
+            return hits["results"]
+        self.stats["web"] += 1
+        KB_LOOKUPS.inc(source="web")
+        return None
+
+    def snapshot(self):
+        with self._lock:
+            docs, total_length = self._totals()
+            terms = self._db.execute("SELECT terms FROM meta WHERE id = 0").fetchone()[0]
+        answered = self.stats["local"] + self.stats["web"]
+        return {
+            "documents": docs,
+            "terms": terms,
+            "avg_doc_length": round(total_length / docs, 1) if docs else 0.0,
+            "indexed": self.stats["indexed"],
+            "refreshed": self.stats["refreshed"],
+            "evicted": self.stats["evicted"],
+            "queries": self.stats["queries"],
+            "avg_query_ms": round(self.stats["query_seconds"] / self.stats["queries"] * 1000, 2)
+            if self.stats["queries"] else 0.0,
+            "answered_locally": self.stats["local"],
+            "local_share": round(self.stats["local"] / answered, 3) if answered else 0.0,
+        }
@@ -0,0 +1,333 @@
+import json
+import re
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator, model_validator
+
+from metrics import span
+
+
+class IncrementalJSONParser:
+    """
+    Feeds LLM output chunk by chunk and reports top-level fields of the first
+    JSON object as soon as each one is complete.
+
+    Anything before the first '{' (``` fences, preambles) is ignored. For keys
+    listed in `stream_arrays`, every element of that array is also reported
+    on its own as soon as it closes, before the array itself is finished.
+
+    feed() returns a list of events:
+        ("item", key, value)   - one complete element of a streamed array
+        ("field", key, value)  - one complete top-level field
+    Fragments that fail to decode are skipped rather than raising.
+    """
+    def __init__(self, stream_arrays=()):
+        self.stream_arrays = set(stream_arrays)
+        self.buf = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.pending_key = None
+        self.key = None
+        self.value_start = None
+        self.item_start = None
+        self.done = False
+        self.rejected = 0
+        self.fields = {}
+        self.items = {}
+
+    def _decode(self, fragment):
+        try:
+            return True, json.loads(fragment)
+        except ValueError:
+            return False, None
+
+    def partial(self):
+        """
+        Best-effort object from everything fed so far: every complete field,
+        plus the decodable elements of streamed arrays whose field never
+        completed (truncated output, or one malformed element).
+        """
+        data = dict(self.fields)
+        for key, items in self.items.items():
+            if key not in data:
+                data[key] = items
+        return data
+
+    def _finish_item(self, end, events):
+        ok, value = self._decode(self.buf[self.item_start:end].strip())
+        if ok:
+            self.items.setdefault(self.key, []).append(value)
+            events.append(("item", self.key, value))
+        else:
+            self.rejected += 1
+        self.item_start = None
+
+    def _finish_field(self, end, events):
+        ok, value = self._decode(self.buf[self.value_start:end].strip())
+        if ok:
+            self.fields[self.key] = value
+            events.append(("field", self.key, value))
+        self.key = None
+        self.value_start = None
+
+    def feed(self, chunk: str):
+        events = []
+        self.buf += chunk
+        buf = self.buf
+        for i in range(self.pos, len(buf)):
+            if self.done:
+                break
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.key is None:
+                        self.pending_key = buf[self.string_start:i + 1]
+                continue
+            if self.depth == 0:
+                if ch == "{":
+                    self.depth = 1
+                continue
+            if ch.isspace():
+                continue
+
+            if self.depth == 1 and self.key is not None and self.value_start is None:
+                self.value_start = i
+            if (self.depth == 2 and self.item_start is None and ch not in ",]"
+                    and self.key in self.stream_arrays and buf[self.value_start] == "["):
+                self.item_start = i
+
+            if ch == '"':
+                self.in_string = True
+                self.string_start = i
+            elif ch == ":" and self.depth == 1 and self.key is None:
+                ok, key = self._decode(self.pending_key or "")
+                self.key = key if ok else ""
+            elif ch == "," and self.depth == 1 and self.value_start is not None:
+                self._finish_field(i, events)
+            elif ch == "," and self.depth == 2 and self.item_start is not None:
+                self._finish_item(i, events)
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 2 and self.item_start is not None and buf[self.item_start] in "{[":
+                    self._finish_item(i + 1, events)
+                elif self.depth == 1:
+                    if self.item_start is not None:
+                        self._finish_item(i, events)
+                    if self.value_start is not None and buf[self.value_start] in "{[":
+                        self._finish_field(i + 1, events)
+                elif self.depth == 0:
+                    if self.value_start is not None:
+                        self._finish_field(i, events)
+                    self.done = True
+        self.pos = len(buf)
+        return events
+
+
+# --- SCHEMA-VALIDATED, SALVAGING EXTRACTION ---
+
+class _Item(BaseModel):
+    # Keep any extra keys the model returns; only the known ones are checked
+    model_config = ConfigDict(extra="allow")
+
+
+class Round(_Item):
+    name: str
+    description: str = ""
+
+
+class Question(_Item):
+    question: str
+    category: str = "General"
+    tip: str = ""
+    answer: str = ""
+
+
+class RoadmapWeek(_Item):
+    week: str
+    focus: str
+    details: str = ""
+
+
+class QuizItem(_Item):
+    question: str
+    options: list[str]
+    correct_answer: int
+    explanation: str = ""
+
+    @field_validator("options")
+    @classmethod
+    def enough_options(cls, options):
+        if len(options) < 2:
+            raise ValueError("at least two options required")
+        return options
+
+    @model_validator(mode="after")
+    def answer_in_range(self):
+        if not 0 <= self.correct_answer < len(self.options):
+            raise ValueError("correct_answer out of range")
+        return self
+
+
+class ResumeScore(_Item):
+    # Only the score is required; the other audit fields pass through and are defaulted by the caller
+    score: int
+
+    @field_validator("score", mode="before")
+    @classmethod
+    def whole_score(cls, score):
+        if isinstance(score, bool) or not isinstance(score, (int, float, str)):
+            raise ValueError("score must be a number")
+        return min(100, max(0, round(float(score))))
+
+
+# Array fields checked item by item for each response shape
+GUIDE_SCHEMA = {"rounds": Round, "questions": Question, "roadmap": RoadmapWeek}
+QUESTIONS_SCHEMA = {"questions": Question}
+QUIZ_SCHEMA = {"quiz": QuizItem}
+
+PARSE_STATS = {
+    "responses": 0,
+    "clean": 0,
+    "salvaged": 0,
+    "failed": 0,
+    "items_valid": 0,
+    "items_recovered": 0,
+    "items_rejected": 0,
+    "fields_rejected": 0,
+}
+
+
+def _strip_trailing_commas(text: str):
+    """Drops commas directly before a closing bracket, leaving string contents untouched."""
+    out = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "}]":
+            end = len(out)
+            while end and out[end - 1].isspace():
+                end -= 1
+            if end and out[end - 1] == ",":
+                del out[end - 1]
+        out.append(ch)
+    return "".join(out)
+
+
+def _strict_parse(text: str):
+    text = text.replace('```json', '').replace('```', '').strip()
+    if text.startswith('['):
+        return json.loads(text)
+    match = re.search(r'(\{.*\})', text, re.DOTALL)
+    return json.loads(match.group(1).strip() if match else text)
+
+
+def validate_item(model, item):
+    """`item` checked against `model` as a plain dict, or None if it does not fit."""
+    try:
+        value = model.model_validate(item).model_dump()
+    except ValidationError:
+        PARSE_STATS["items_rejected"] += 1
+        return None
+    PARSE_STATS["items_valid"] += 1
+    return value
+
+
+def validate_field(key: str, items, schema: dict):
+    """The valid elements of one schema array field, or None if the field is not a list at all."""
+    if not isinstance(items, list):
+        PARSE_STATS["fields_rejected"] += 1
+        return None
+    return [value for value in (validate_item(schema[key], item) for item in items) if value is not None]
+
+
+def _validate_items(data: dict, schema: dict, salvaged: bool):
+    for key in schema:
+        if key not in data:
+            continue
+        valid = validate_field(key, data[key], schema)
+        if valid is None:
+            # e.g. {"questions": null} or a lone object: treat the field as missing
+            del data[key]
+            continue
+        if salvaged:
+            PARSE_STATS["items_recovered"] += len(valid)
+        data[key] = valid
+    return data or None
+
+
+def extract_json(text, schema: dict = None):
+    """
+    Parses the JSON object in an LLM response.
+
+    Tries a strict parse first. If that fails (truncated output, one broken
+    element, trailing commas), it salvages every complete top-level field and
+    every complete element of the schema's arrays instead of discarding the
+    whole response. Array elements are validated against `schema` and
+    invalid ones dropped. Returns None only when nothing usable was found.
+    """
+    with span("extract_json"):
+        return _extract_json(text, schema)
+
+
+def _extract_json(text, schema: dict = None):
+    PARSE_STATS["responses"] += 1
+    if not text:
+        PARSE_STATS["failed"] += 1
+        return None
+    schema = schema or {}
+    try:
+        data = _strict_parse(text)
+        if isinstance(data, list) and len(schema) == 1:
+            # A bare array for a single-array shape, e.g. [{"question": ...}, ...]
+            data = {next(iter(schema)): data}
+        if isinstance(data, dict):
+            data = _validate_items(data, schema, salvaged=False)
+            PARSE_STATS["clean" if data else "failed"] += 1
+            return data
+    except (ValueError, AttributeError):
+        pass
+
+    parser = IncrementalJSONParser(stream_arrays=schema.keys())
+    parser.feed(_strip_trailing_commas(text))
+    data = parser.partial()
+    PARSE_STATS["items_rejected"] += parser.rejected
+    if not data:
+        PARSE_STATS["failed"] += 1
+        return None
+    data = _validate_items(data, schema, salvaged=True)
+    PARSE_STATS["salvaged" if data else "failed"] += 1
+    return data
+
+
+def extract_model(text, model):
+    """
+    Strictly parses the JSON object in an LLM response and validates it as a
+    whole against `model`. Nothing is salvaged or defaulted: a truncated or
+    incomplete reply returns None, so it is never mistaken for a real result.
+    """
+    with span("extract_json"):
+        PARSE_STATS["responses"] += 1
+        try:
+            value = model.model_validate(_strict_parse(text or "")).model_dump()
+        except (ValueError, AttributeError):
+            PARSE_STATS["failed"] += 1
+            return None
+        PARSE_STATS["clean"] += 1
+        return value
@@ -0,0 +1,172 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# --- METRICS (Prometheus text exposition, no extra dependency) ---
+
+# Seconds; spans range from cache lookups to multi-second Gemini calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_lock = threading.Lock()
+
+# Set per HTTP request by the request-ID middleware; read by log_event()
+request_id = ContextVar("request_id", default=None)
+# Structured events; server.py gives this logger a bare-message handler so each one is a single JSON line
+event_log = logging.getLogger("careerflow")
+
+
+def _label_key(labelnames, labels):
+    missing = set(labelnames) ^ set(labels)
+    if missing:
+        raise ValueError(f"Label mismatch: {sorted(missing)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', repr(bound))])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+def render_metrics() -> str:
+    with _lock:
+        return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+# Shared metric families; modules record into these instead of defining their own
+STAGE_SECONDS = Histogram(
+    "careerflow_stage_seconds", "Latency of one pipeline stage (search query, model attempt, parse, ...)",
+    ("stage", "outcome")
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "careerflow_http_request_seconds", "End-to-end HTTP request latency", ("method", "route", "status")
+)
+AI_ATTEMPT_SECONDS = Histogram(
+    "careerflow_ai_attempt_seconds", "Latency of one Gemini model attempt", ("model", "outcome")
+)
+AI_MODEL_FALLBACKS = Counter("careerflow_ai_model_fallbacks_total", "Calls moved on to a lower-priority model", ("model",))
+AI_RATE_LIMITED = Counter("careerflow_ai_rate_limited_total", "429 responses from Gemini", ("model",))
+AI_HEDGES = Counter(
+    "careerflow_ai_hedges_total", "Hedged Gemini requests: fired, won (hedge answered first), lost, skipped", ("outcome",)
+)
+FALLBACK_ACTIVATIONS = Counter(
+    "careerflow_fallback_activations_total", "Responses served from the template fallback engine", ("endpoint",)
+)
+CACHE_LOOKUPS = Counter("careerflow_cache_lookups_total", "Cache lookups by outcome", ("cache", "result"))
+STARTUP_SECONDS = Gauge(
+    "careerflow_startup_seconds", "Duration of each startup step (imports, warm-up) and total time to ready", ("step",)
+)
+
+
+@contextmanager
+def span(stage: str):
+    """Times a block into careerflow_stage_seconds, labelled ok/error by whether it raised."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage, outcome=outcome)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def log_event(event: str, **fields):
+    """One JSON log line, tagged with the current request ID when there is one."""
+    if not event_log.isEnabledFor(logging.INFO):
+        return
+    record = {"ts": round(time.time(), 3), "event": event, "request_id": request_id.get(), **fields}
+    event_log.info(json.dumps(record, default=str))
@@ -0,0 +1,79 @@
+"""
+PDF extraction worker, started by resume_ingest.ExtractionPool as a plain
+`python pdf_worker.py` child. It imports nothing from the app, so it starts
+clean: no inherited threads, event loop or SQLite connections, and it runs
+the same way on Windows. Jobs and replies are length-prefixed pickles over
+stdin/stdout.
+"""
+import importlib
+import io
+import pickle
+import struct
+import sys
+import time
+
+_HEADER = struct.Struct("!I")
+
+
+def extract_pages(pdf_bytes: bytes, char_budget: int, max_pages: int):
+    """
+    Extracts page by page and stops once the character budget is met.
+    Returns text plus per-page timings.
+    """
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    parts = []
+    chars = 0
+    timings = []
+    for index, page in enumerate(reader.pages):
+        if chars >= char_budget or index >= max_pages:
+            break
+        started = time.perf_counter()
+        text = page.extract_text() or ""
+        timings.append({"page": index + 1, "ms": round((time.perf_counter() - started) * 1000, 2), "chars": len(text)})
+        parts.append(text)
+        chars += len(text)
+    return {
+        "text": "".join(parts)[:char_budget],
+        "pages_total": len(reader.pages),
+        "pages_read": len(timings),
+        "page_timings": timings,
+    }
+
+
+def write_frame(stream, value):
+    payload = pickle.dumps(value)
+    stream.write(_HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def read_frame(stream):
+    """The next value on `stream`, or None once the other side has closed it."""
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (size,) = _HEADER.unpack(header)
+    payload = stream.read(size)
+    if len(payload) < size:
+        return None
+    return pickle.loads(payload)
+
+
+def serve(requests, replies):
+    # One extract_pages() argument tuple in, one (ok, result or error) reply out
+    while (args := read_frame(requests)) is not None:
+        try:
+            reply = (True, extract_pages(*args))
+        except Exception as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        write_frame(replies, reply)
+
+
+if __name__ == "__main__":
+    replies = sys.stdout.buffer
+    # Anything printed along the way (PyPDF2 warnings) must not land in the reply stream
+    sys.stdout = sys.stderr
+    # Paid once at start-up instead of on the first document
+    importlib.import_module("PyPDF2")
+    serve(sys.stdin.buffer, replies)
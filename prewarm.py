@@ -0,0 +1,231 @@
+"""
+Background pre-generation of interview guides and MCQ bank top-ups.
+
+Runs in-process (PREWARM_ENABLED=1 starts it with the server) or standalone:
+
+    python prewarm.py            # one pass over the top-N companies
+    python prewarm.py --loop     # keep refreshing every PREWARM_INTERVAL seconds
+
+Results land in the same SQLite-backed stores the endpoints read first, so a
+standalone run warms a server started afterwards (or restarted) as well.
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from cache import CACHE_DIR, canonical_company, open_sqlite
+from metrics import log_event
+from shared_state import after_fork
+
+# Featured on the dashboard; used until real demand has been recorded
+DEFAULT_COMPANIES = ["Google", "Amazon", "Microsoft", "Meta", "TCS", "Infosys", "Wipro", "Accenture"]
+# Request counts are buffered in memory and written in one batch this often
+DEMAND_FLUSH_INTERVAL = float(os.getenv("DEMAND_FLUSH_INTERVAL", "10"))
+
+
+class DemandTracker:
+    """
+    Counts requests per canonical company so the warm list follows real traffic.
+    record() only touches an in-memory buffer; it is written to SQLite in one
+    transaction every DEMAND_FLUSH_INTERVAL seconds, off the event loop when
+    one is running, and before every top().
+    """
+    def __init__(self, path: str = None, flush_interval: float = None):
+        self.path = path or os.path.join(CACHE_DIR, "demand.sqlite3")
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.flush_interval = DEMAND_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._next_flush = time.time() + self.flush_interval
+        self._db = None
+        after_fork(self._after_fork)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = open_sqlite(self.path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS demand ("
+                "company TEXT PRIMARY KEY, display_name TEXT NOT NULL, hits INTEGER NOT NULL, last_seen REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            log_event("demand_tracking_disabled", error=str(e))
+            self._db = None
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        # The parent still holds (and will write) anything buffered before the fork
+        self._pending = {}
+        if self._db is not None:
+            self._db = open_sqlite(self.path)
+
+    def record(self, company_name: str):
+        key = canonical_company(company_name)
+        if not key or self._db is None:
+            return
+        now = time.time()
+        with self._lock:
+            _, hits, _ = self._pending.get(key, (None, 0, None))
+            self._pending[key] = (company_name.strip(), hits + 1, now)
+        if now < self._next_flush:
+            return
+        self._next_flush = now + self.flush_interval
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        asyncio.ensure_future(asyncio.to_thread(self.flush)).add_done_callback(_flush_failed)
+
+    def flush(self):
+        """Writes the buffered counts in one transaction."""
+        if self._db is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            self._db.executemany(
+                "INSERT INTO demand (company, display_name, hits, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(company) DO UPDATE SET hits = hits + excluded.hits, last_seen = excluded.last_seen",
+                [(key, name, hits, seen) for key, (name, hits, seen) in pending.items()]
+            )
+            self._db.commit()
+
+    def top(self, n: int):
+        if self._db is None:
+            return []
+        self.flush()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT display_name FROM demand ORDER BY hits DESC, last_seen DESC LIMIT ?", (n,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+
+def _flush_failed(task):
+    if not task.cancelled() and task.exception() is not None:
+        log_event("demand_flush_failed", error=str(task.exception()))
+
+
+class PrewarmScheduler:
+    """
+    Walks a ranked company list and pre-computes a guide and a batch of MCQs for
+    each one, skipping anything still fresh and stopping once the per-pass
+    Gemini request budget is spent.
+
+    `warm_guide` / `warm_quiz` are async callables taking a company name; they
+    are expected to write into the stores the endpoints read from; so is
+    `is_fresh(kind, company)`, which reports whether a kind needs no warming.
+    """
+    def __init__(self, warm_guide, warm_quiz, is_fresh, ai_engine, demand: DemandTracker,
+                 top_n=None, budget=None, interval=None, companies=None):
+        self.warm_guide = warm_guide
+        self.warm_quiz = warm_quiz
+        self.is_fresh = is_fresh
+        self.ai_engine = ai_engine
+        self.demand = demand
+        self.top_n = top_n or int(os.getenv("PREWARM_TOP_N", "20"))
+        self.budget = budget or int(os.getenv("PREWARM_BUDGET", "40"))
+        self.interval = interval or float(os.getenv("PREWARM_INTERVAL", "3600"))
+        self.companies = companies
+        self._task = None
+        self.status = {
+            "running": False,
+            "passes": 0,
+            "last_started": None,
+            "last_finished": None,
+            "budget": self.budget,
+            "budget_used": 0,
+            "companies": {},
+        }
+
+    def ranked_companies(self):
+        """Explicit list (PREWARM_COMPANIES / PREWARM_COMPANIES_FILE) wins, then recorded demand, then defaults."""
+        if self.companies:
+            return self.companies[:self.top_n]
+        configured = os.getenv("PREWARM_COMPANIES")
+        if configured:
+            return [c.strip() for c in configured.split(",") if c.strip()][:self.top_n]
+        path = os.getenv("PREWARM_COMPANIES_FILE")
+        if path and os.path.exists(path):
+            with open(path) as f:
+                return [line.strip() for line in f if line.strip() and not line.startswith("#")][:self.top_n]
+        ranked = self.demand.top(self.top_n)
+        for company in DEFAULT_COMPANIES:
+            if len(ranked) >= self.top_n:
+                break
+            if canonical_company(company) not in {canonical_company(c) for c in ranked}:
+                ranked.append(company)
+        return ranked
+
+    async def run_once(self):
+        self.status.update({"running": True, "last_started": time.time(), "budget_used": 0})
+        try:
+            # Only this job's own Gemini attempts count; user traffic during the pass does not
+            with self.ai_engine.count_attempts() as tally:
+                for company in self.ranked_companies():
+                    for kind, warm in (("guide", self.warm_guide), ("quiz", self.warm_quiz)):
+                        used = tally["attempts"]
+                        self.status["budget_used"] = used
+                        entry = self.status["companies"].setdefault(company, {})
+                        if await self.is_fresh(kind, company):
+                            entry[kind] = "fresh"
+                            continue
+                        if used >= self.budget:
+                            entry[kind] = "skipped (budget exhausted)"
+                            continue
+                        try:
+                            await warm(company)
+                            entry[kind] = "warmed"
+                        except Exception as e:
+                            entry[kind] = f"failed: {e}"
+                            log_event("prewarm_error", kind=kind, company=company, error=str(e))
+                self.status["budget_used"] = tally["attempts"]
+        finally:
+            self.status["running"] = False
+            self.status["last_finished"] = time.time()
+            self.status["passes"] += 1
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                log_event("prewarm_pass_failed", error=str(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate interview guides and MCQ bank top-ups")
+    parser.add_argument("--loop", action="store_true", help="keep refreshing every PREWARM_INTERVAL seconds")
+    args = parser.parse_args()
+
+    import server
+
+    async def run():
+        if args.loop:
+            await server.prewarmer.run_forever()
+        else:
+            await server.prewarmer.run_once()
+            print(server.prewarm_status())
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
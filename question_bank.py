@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from cache import CACHE_DIR, canonical_company, open_sqlite
+from context_builder import is_near_duplicate, shingle_set, tokenize
+from shared_state import after_fork
+
+# --- MCQ BANK (persistent, deduplicated, per-user no-repeat) ---
+
+CATEGORIES = ["DSA", "Tech Stack", "System Design", "Engineering Principles"]
+_CATEGORY_ALIASES = {
+    "algorithms": "DSA", "data structures": "DSA", "dsa": "DSA",
+    "tech stack": "Tech Stack", "technology": "Tech Stack",
+    "system design": "System Design", "architecture": "System Design",
+    "engineering principles": "Engineering Principles", "core engineering": "Engineering Principles",
+}
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9+# ]", " ", (text or "").lower()).split())
+
+
+def question_hash(text: str) -> str:
+    return hashlib.sha1(normalize_question(text).encode()).hexdigest()
+
+
+def normalize_category(category) -> str:
+    key = (category or "").strip().lower()
+    for alias, canonical in _CATEGORY_ALIASES.items():
+        if alias in key:
+            return canonical
+    return "Engineering Principles"
+
+
+def valid_mcq(item) -> bool:
+    if not isinstance(item, dict) or not str(item.get("question") or "").strip():
+        return False
+    options = item.get("options")
+    answer = item.get("correct_answer")
+    return (isinstance(options, list) and len(options) >= 2
+            and isinstance(answer, int) and not isinstance(answer, bool) and 0 <= answer < len(options))
+
+
+class QuestionStore:
+    """
+    Base of the SQLite question stores: JSON payloads per company, unique on
+    (company, qhash). add() drops invalid items, exact duplicates (caught by
+    the hash) and near-duplicates (shingle Jaccard against the company's
+    stored questions).
+
+    Subclasses set `table` and `schema` and implement _valid(item) and
+    _row(company, item), the column values to insert besides `created`.
+    """
+    table = None
+    schema = ""
+
+    def __init__(self, path: str, **stats):
+        self.path = path
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = open_sqlite(self.path)
+        self._lock = threading.Lock()
+        after_fork(self._after_fork)
+        self._shingles = {}
+        self.stats = {"added": 0, "duplicates": 0, "invalid": 0, **stats}
+        with self._lock:
+            self._db.executescript(self.schema)
+            self._db.commit()
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._db = open_sqlite(self.path)
+
+    def _company_shingles(self, company: str):
+        # Built lazily per company, then kept in step with inserts
+        if company not in self._shingles:
+            rows = self._db.execute(f"SELECT payload FROM {self.table} WHERE company = ?", (company,)).fetchall()
+            self._shingles[company] = [shingle_set(tokenize(json.loads(r[0])["question"])) for r in rows]
+        return self._shingles[company]
+
+    def _valid(self, item) -> bool:
+        raise NotImplementedError
+
+    def _row(self, company: str, item) -> dict:
+        raise NotImplementedError
+
+    def add(self, company_name: str, items):
+        """Stores valid, non-duplicate questions. Returns how many were added."""
+        company = canonical_company(company_name)
+        added = 0
+        with self._lock:
+            existing = self._company_shingles(company)
+            for item in items:
+                if not self._valid(item):
+                    self.stats["invalid"] += 1
+                    continue
+                shingles = shingle_set(tokenize(item["question"]))
+                if is_near_duplicate(shingles, existing):
+                    self.stats["duplicates"] += 1
+                    continue
+                row = {**self._row(company, item), "created": time.time()}
+                cursor = self._db.execute(
+                    f"INSERT OR IGNORE INTO {self.table} ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                    list(row.values())
+                )
+                if cursor.rowcount:
+                    existing.append(shingles)
+                    added += 1
+                else:
+                    self.stats["duplicates"] += 1
+            self._db.commit()
+        self.stats["added"] += added
+        return added
+
+
+class QuestionBank(QuestionStore):
+    """
+    SQLite-backed MCQ store indexed by (company, category), deduplicated as
+    in QuestionStore. Served questions are recorded per user so a user never
+    sees the same question twice.
+    """
+    table = "mcq"
+    schema = """
+        CREATE TABLE IF NOT EXISTS mcq (
+            id INTEGER PRIMARY KEY,
+            company TEXT NOT NULL,
+            category TEXT NOT NULL,
+            qhash TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created REAL NOT NULL,
+            UNIQUE (company, qhash)
+        );
+        CREATE INDEX IF NOT EXISTS mcq_company_category ON mcq (company, category);
+        CREATE TABLE IF NOT EXISTS served (
+            user_id TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            served_at REAL NOT NULL,
+            PRIMARY KEY (user_id, question_id)
+        );
+    """
+
+    def __init__(self, path: str = None):
+        super().__init__(path or os.path.join(CACHE_DIR, "question_bank.sqlite3"), served=0)
+
+    def _valid(self, item) -> bool:
+        return valid_mcq(item)
+
+    def _row(self, company: str, item) -> dict:
+        category = normalize_category(item.get("category"))
+        payload = {
+            "question": item["question"],
+            "options": item["options"],
+            "correct_answer": item["correct_answer"],
+            "explanation": item.get("explanation", ""),
+            "category": category,
+        }
+        return {"company": company, "category": category, "qhash": question_hash(item["question"]),
+                "payload": json.dumps(payload)}
+
+    def unseen_counts(self, company_name: str, user_id: str = None):
+        """Unseen questions per category for this user (all questions if anonymous)."""
+        company = canonical_company(company_name)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT category, COUNT(*) FROM mcq WHERE company = ? AND id NOT IN "
+                "(SELECT question_id FROM served WHERE user_id = ?) GROUP BY category",
+                (company, user_id or "")
+            ).fetchall()
+        counts = {c: 0 for c in CATEGORIES}
+        counts.update(dict(rows))
+        return counts
+
+    def draw(self, company_name: str, count: int, user_id: str = None):
+        """
+        Up to `count` unseen questions, balanced round-robin across categories,
+        and marks them served for `user_id`.
+        """
+        company = canonical_company(company_name)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, category, payload FROM mcq WHERE company = ? AND id NOT IN "
+                "(SELECT question_id FROM served WHERE user_id = ?)",
+                (company, user_id or "")
+            ).fetchall()
+            by_category = {}
+            for row in rows:
+                by_category.setdefault(row[1], []).append(row)
+            for bucket in by_category.values():
+                random.shuffle(bucket)
+            picked = []
+            while len(picked) < count and any(by_category.values()):
+                for bucket in by_category.values():
+                    if bucket and len(picked) < count:
+                        picked.append(bucket.pop())
+            if user_id:
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO served (user_id, question_id, served_at) VALUES (?, ?, ?)",
+                    [(user_id, row[0], now) for row in picked]
+                )
+                self._db.commit()
+        self.stats["served"] += len(picked)
+        quiz = [json.loads(row[2]) for row in picked]
+        random.shuffle(quiz)
+        return quiz
+
+    def size(self, company_name: str) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM mcq WHERE company = ?", (canonical_company(company_name),)
+            ).fetchone()[0]
+
+    def snapshot(self):
+        with self._lock:
+            companies = self._db.execute("SELECT COUNT(DISTINCT company), COUNT(*) FROM mcq").fetchone()
+        return {**self.stats, "companies": companies[0], "questions": companies[1]}
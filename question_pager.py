@@ -0,0 +1,176 @@
+import base64
+import json
+import os
+import secrets
+
+from cache import CACHE_DIR, canonical_company
+from question_bank import QuestionStore, question_hash
+from shared_state import LocalState
+
+# --- PRACTICE QUESTION PAGES (pre-generated buffer, cursor sessions, no repeats) ---
+
+QUESTION_PAGE_SIZE = int(os.getenv("QUESTION_PAGE_SIZE", "20"))
+QUESTION_SESSION_TTL = float(os.getenv("QUESTION_SESSION_TTL", str(24 * 3600)))
+# Served-set cap per session; the oldest hashes are evicted first
+QUESTION_SESSION_MAX_SERVED = int(os.getenv("QUESTION_SESSION_MAX_SERVED", "2000"))
+# 48 bits of the question hash is plenty to tell a session's questions apart
+_HASH_CHARS = 12
+
+
+def _short_hash(text: str) -> str:
+    return question_hash(text)[:_HASH_CHARS]
+
+
+def encode_cursor(session: str, page: int) -> str:
+    return base64.urlsafe_b64encode(f"{session}:{page}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """(session, page), or (None, 0) for a missing or malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        session, page = raw.rsplit(":", 1)
+        return session, int(page)
+    except (ValueError, TypeError, AttributeError):
+        return None, 0
+
+
+class QuestionBuffer(QuestionStore):
+    """
+    SQLite store of pre-generated open-ended practice questions per company,
+    deduplicated on insert as in QuestionStore.
+    """
+    table = "question"
+    schema = """
+        CREATE TABLE IF NOT EXISTS question (
+            id INTEGER PRIMARY KEY,
+            company TEXT NOT NULL,
+            qhash TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created REAL NOT NULL,
+            UNIQUE (company, qhash)
+        );
+    """
+
+    def __init__(self, path: str = None):
+        super().__init__(path or os.path.join(CACHE_DIR, "question_buffer.sqlite3"))
+
+    def _valid(self, item) -> bool:
+        return isinstance(item, dict) and bool(str(item.get("question") or "").strip())
+
+    def _row(self, company: str, item) -> dict:
+        payload = {
+            "question": item["question"],
+            "category": item.get("category") or "General",
+            "tip": item.get("tip", ""),
+            "answer": item.get("answer", ""),
+        }
+        return {"company": company, "qhash": _short_hash(item["question"]), "payload": json.dumps(payload)}
+
+    def rows(self, company_name: str):
+        """[(short hash, question)] oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT qhash, payload FROM question WHERE company = ? ORDER BY id", (canonical_company(company_name),)
+            ).fetchall()
+        return [(h, json.loads(p)) for h, p in rows]
+
+    def latest(self, company_name: str, limit: int):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT payload FROM question WHERE company = ? ORDER BY id DESC LIMIT ?",
+                (canonical_company(company_name), limit)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def snapshot(self):
+        with self._lock:
+            companies = self._db.execute("SELECT COUNT(DISTINCT company), COUNT(*) FROM question").fetchone()
+        return {**self.stats, "companies": companies[0], "questions": companies[1]}
+
+
+class QuestionPager:
+    """
+    Cursor pagination over a QuestionBuffer. Each session (one user browsing
+    one company) keeps, in the shared state store, the short hashes of every
+    question it was served (capped, oldest evicted) plus its last page, so:
+
+    - a page never repeats a question the session has already seen
+      (including the guide's questions the client sends as `seen`),
+    - retrying a request with the same cursor returns the same page,
+    - any worker can answer the next page.
+    """
+    def __init__(self, buffer: QuestionBuffer, state=None, page_size=None, ttl=None, max_served=None):
+        self.buffer = buffer
+        self.store = state or LocalState()
+        self.page_size = page_size or QUESTION_PAGE_SIZE
+        self.ttl = ttl or QUESTION_SESSION_TTL
+        self.max_served = max_served or QUESTION_SESSION_MAX_SERVED
+        self.stats = {"sessions": 0, "pages": 0, "replays": 0, "expired_cursors": 0, "served": 0}
+
+    def _key(self, session: str):
+        return f"pages:{session}"
+
+    async def open(self, company_name: str, cursor: str = None, seen=()):
+        """
+        Resolves a request to (session, page, replay). `replay` is the stored
+        page when this cursor was already answered, else None. Unknown or
+        expired cursors start a new session seeded with `seen` question texts.
+        """
+        company = canonical_company(company_name)
+        session, page = decode_cursor(cursor) if cursor else (None, 0)
+        state = await self.store.aget(self._key(session)) if session else None
+        if state is None or state["company"] != company:
+            if cursor:
+                self.stats["expired_cursors"] += 1
+            session = secrets.token_urlsafe(9)
+            served = [_short_hash(text) for text in seen if isinstance(text, str)][-self.max_served:]
+            await self.store.aset(self._key(session), {"company": company, "served": served, "next": 0, "last": None},
+                                  ttl=self.ttl)
+            self.stats["sessions"] += 1
+            return session, 0, None
+        last = state.get("last")
+        if last and last["page"] == page:
+            self.stats["replays"] += 1
+            return session, page, last["questions"]
+        return session, state["next"], None
+
+    async def unseen(self, session: str, company_name: str):
+        """Buffered questions this session has not been served yet, oldest first."""
+        state = await self.store.aget(self._key(session))
+        served = set(state["served"]) if state else set()
+        return [question for h, question in self.buffer.rows(company_name) if h not in served]
+
+    async def serve(self, session: str, company_name: str, page: int, candidates):
+        """Serves up to page_size of `candidates` not yet seen and records them. Returns the response body."""
+        company = canonical_company(company_name)
+
+        def take(state):
+            state = state or {"company": company, "served": [], "next": 0, "last": None}
+            served = set(state["served"])
+            picked, hashes = [], []
+            for question in candidates:
+                h = _short_hash(question["question"])
+                if h in served:
+                    continue
+                served.add(h)
+                hashes.append(h)
+                picked.append(question)
+                if len(picked) >= self.page_size:
+                    break
+            state["served"] = (state["served"] + hashes)[-self.max_served:]
+            state["next"] = page + 1
+            state["last"] = {"page": page, "questions": picked}
+            return state, picked
+
+        # Atomic, so two taps racing on one session cannot both get the same questions
+        picked = await self.store.aupdate(self._key(session), take, ttl=self.ttl)
+        self.stats["pages"] += 1
+        self.stats["served"] += len(picked)
+        return self.response(session, page, picked)
+
+    def response(self, session: str, page: int, questions):
+        return {"questions": questions, "cursor": encode_cursor(session, page + 1), "page": page}
+
+    def snapshot(self):
+        return {**self.stats, "page_size": self.page_size, "buffer": self.buffer.snapshot()}
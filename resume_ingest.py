@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from metrics import log_event, span
+from pdf_worker import read_frame, write_frame
+from shared_state import after_fork
+
+# --- RESUME INGESTION (bounded upload, off-loop PDF extraction) ---
+
+RESUME_MAX_BYTES = int(os.getenv("RESUME_MAX_BYTES", str(5 * 1024 * 1024)))
+# The audit prompt only ever uses this many characters of resume text
+RESUME_CHAR_BUDGET = int(os.getenv("RESUME_CHAR_BUDGET", "4000"))
+RESUME_MAX_PAGES = int(os.getenv("RESUME_MAX_PAGES", "10"))
+RESUME_EXTRACT_TIMEOUT = float(os.getenv("RESUME_EXTRACT_TIMEOUT", "10"))
+RESUME_PDF_WORKERS = int(os.getenv("RESUME_PDF_WORKERS", "2"))
+
+_CHUNK_SIZE = 64 * 1024
+_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf_worker.py")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+async def spool_upload(file, max_bytes: int = None):
+    """
+    Copies an UploadFile into a SpooledTemporaryFile chunk by chunk, failing as
+    soon as the running size passes the cap instead of buffering it all first.
+    Returns the spooled file rewound to the start and the SHA-256 of its bytes.
+
+    Starlette has already parsed the multipart body by the time this runs, so
+    the cap bounds what is copied and hashed, not what was received. Requests
+    that declare a Content-Length are turned away earlier by the server's
+    upload middleware; chunked bodies are only checked here.
+    """
+    max_bytes = max_bytes or RESUME_MAX_BYTES
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await file.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            spooled.close()
+            raise UploadTooLarge(f"Resume exceeds {max_bytes // 1024} KB limit")
+        spooled.write(chunk)
+        digest.update(chunk)
+    spooled.seek(0)
+    return spooled, digest.hexdigest()
+
+
+class _PdfWorker:
+    """
+    One pdf_worker.py process with private pipes, so a stuck document can be
+    killed on its own. Each round trip blocks a thread, not the event loop.
+    """
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, _WORKER_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        self.alive = True
+
+    def _call(self, args):
+        # A kill() from the event loop ends a stuck call with a broken pipe or EOF
+        write_frame(self.process.stdin, args)
+        reply = read_frame(self.process.stdout)
+        if reply is None:
+            raise Exception(f"PDF worker exited with status {self.process.poll()}")
+        return reply
+
+    async def run(self, args, timeout: float):
+        try:
+            ok, value = await asyncio.wait_for(asyncio.to_thread(self._call, args), timeout)
+        except BaseException:
+            # Timed out, cancelled or crashed mid-document: the reply can never be matched up
+            # with a later job, so this process goes; the rest of the pool is untouched
+            self.kill()
+            raise
+        if not ok:
+            raise Exception(value)
+        return value
+
+    def kill(self):
+        self.alive = False
+        if self.process.poll() is None:
+            self.process.kill()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class ExtractionPool:
+    """
+    RESUME_PDF_WORKERS long-lived extraction processes. A document waits for
+    a free worker first; its deadline only starts once a worker has it. On a
+    timeout only that worker is killed and replaced on demand.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self._idle = []
+        self._workers = set()
+        self._slots = asyncio.Semaphore(size)
+        self.stats = {"extractions": 0, "timeouts": 0, "workers_killed": 0}
+        after_fork(self._after_fork)
+
+    def _after_fork(self):
+        # The parent's worker pipes are not ours to use
+        self._idle, self._workers = [], set()
+        self._slots = asyncio.Semaphore(self.size)
+
+    def _checkout(self):
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.process.poll() is None:
+                return worker
+            worker.kill()
+            self._workers.discard(worker)
+        worker = _PdfWorker()
+        self._workers.add(worker)
+        return worker
+
+    async def run(self, args, timeout: float):
+        async with self._slots:
+            worker = self._checkout()
+            try:
+                return await worker.run(args, timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise
+            finally:
+                self.stats["extractions"] += 1
+                if worker.alive:
+                    self._idle.append(worker)
+                else:
+                    self.stats["workers_killed"] += 1
+                    self._workers.discard(worker)
+
+    def start(self):
+        while len(self._workers) < self.size:
+            worker = _PdfWorker()
+            self._workers.add(worker)
+            self._idle.append(worker)
+        return len(self._workers)
+
+    def shutdown(self):
+        for worker in list(self._workers):
+            worker.kill()
+        self._idle, self._workers = [], set()
+
+
+_pool = ExtractionPool(RESUME_PDF_WORKERS)
+
+
+async def warm_pool():
+    """Starts the extraction workers; each imports PyPDF2 on its own while the app finishes warming up."""
+    return await asyncio.to_thread(_pool.start)
+
+
+def shutdown_pool():
+    _pool.shutdown()
+
+
+def pool_stats():
+    return {**_pool.stats, "workers": len(_pool._workers), "idle": len(_pool._idle)}
+
+
+async def extract_resume_text(pdf_bytes: bytes, char_budget: int = None, timeout: float = None):
+    """
+    Extracts resume text in the worker pool. The per-document deadline covers
+    the extraction itself, not the wait for a free worker.
+    """
+    started = time.perf_counter()
+    try:
+        with span("pdf_extract"):
+            result = await _pool.run(
+                (pdf_bytes, char_budget or RESUME_CHAR_BUDGET, RESUME_MAX_PAGES), timeout or RESUME_EXTRACT_TIMEOUT
+            )
+    except asyncio.TimeoutError:
+        raise ExtractionTimeout(f"PDF extraction exceeded {timeout or RESUME_EXTRACT_TIMEOUT}s")
+    result["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    log_event("pdf_extracted", pages_read=result["pages_read"], pages_total=result["pages_total"],
+              chars=len(result["text"]), total_ms=result["total_ms"],
+              page_ms=[t["ms"] for t in result["page_timings"]])
+    return result
@@ -0,0 +1,257 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+from metrics import Counter, span
+from shared_state import LocalState
+
+# --- QUOTA-AWARE PRIORITY SCHEDULER (per-model RPM/TPM token buckets) ---
+
+# rank (lower is served first), default max queue wait in seconds
+PRIORITY_CLASSES = {
+    "interactive": (0, float(os.getenv("AI_WAIT_INTERACTIVE", "5"))),   # /ask-ai chat
+    "standard": (1, float(os.getenv("AI_WAIT_STANDARD", "15"))),        # resume scoring, interview guides
+    "bulk": (2, float(os.getenv("AI_WAIT_BULK", "20"))),                # mock tests, more questions, batch scoring
+    "background": (3, float(os.getenv("AI_WAIT_BACKGROUND", "120"))),   # pre-generation
+}
+# Tokens reserved for the reply on top of the prompt estimate
+DEFAULT_OUTPUT_TOKENS = int(os.getenv("AI_OUTPUT_TOKENS_ESTIMATE", "1024"))
+
+QUOTA_REJECTIONS = Counter(
+    "careerflow_quota_rejections_total", "Gemini calls rejected by admission control", ("model", "priority", "reason")
+)
+
+
+class QuotaExceeded(Exception):
+    """Raised when a call cannot be admitted in time. `retry_after` is in seconds."""
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _refill(level, updated, per_minute, now):
+    # Continuous refill at per_minute / 60 per second, holding at most one minute's worth
+    return min(per_minute, level + max(0.0, now - updated) * per_minute / 60.0)
+
+
+def _bucket_wait(level, per_minute, amount):
+    # A single request larger than the bucket can never fit; let it through once full
+    amount = min(amount, per_minute)
+    if level >= amount:
+        return 0.0
+    return (amount - level) * 60.0 / per_minute if per_minute else float("inf")
+
+
+class ModelQuota:
+    """
+    RPM and TPM token buckets for one model, kept in the shared state store
+    (wall-clock timestamps) so every worker process draws from the same quota.
+    """
+    def __init__(self, model: str, rpm: float, tpm: float, state=None):
+        self.key = f"quota:{model}"
+        self.rpm = rpm
+        self.tpm = tpm
+        self.state = state or LocalState()
+
+    def _current(self, bucket, now):
+        if bucket is None:
+            return self.rpm, self.tpm, 0.0
+        return (
+            _refill(bucket["requests"], bucket["updated"], self.rpm, now),
+            _refill(bucket["tokens"], bucket["updated"], self.tpm, now),
+            bucket["blocked_until"],
+        )
+
+    def _wait(self, requests_level, tokens_level, blocked_until, tokens, requests, now):
+        return max(
+            _bucket_wait(requests_level, self.rpm, requests),
+            _bucket_wait(tokens_level, self.tpm, tokens),
+            blocked_until - now,
+            0.0,
+        )
+
+    async def time_until(self, tokens: float, requests: int = 1) -> float:
+        """Read-only estimate of how long until `requests` calls totalling `tokens` would fit."""
+        bucket = await self.state.aget(self.key)
+        now = time.time()
+        return self._wait(*self._current(bucket, now), tokens, requests, now)
+
+    async def try_take(self, tokens: float) -> float:
+        """Atomically takes one request and `tokens` if both fit. Returns 0.0 if taken, else the wait."""
+        def take(bucket):
+            now = time.time()
+            requests_level, tokens_level, blocked_until = self._current(bucket, now)
+            wait = self._wait(requests_level, tokens_level, blocked_until, tokens, 1, now)
+            if wait <= 0:
+                requests_level -= min(1, self.rpm)
+                tokens_level -= min(tokens, self.tpm)
+            return {"requests": requests_level, "tokens": tokens_level, "updated": now,
+                    "blocked_until": blocked_until}, wait
+        return await self.state.aupdate(self.key, take)
+
+    async def throttle(self, seconds: float):
+        # Upstream said 429: our estimate of the remaining quota was too optimistic
+        def block(bucket):
+            now = time.time()
+            _, tokens_level, blocked_until = self._current(bucket, now)
+            return {"requests": 0.0, "tokens": tokens_level, "updated": now,
+                    "blocked_until": max(blocked_until, now + seconds)}, None
+        await self.state.aupdate(self.key, block)
+
+    def snapshot(self):
+        now = time.time()
+        requests_level, tokens_level, blocked_until = self._current(self.state.get(self.key), now)
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "requests_available": round(max(0.0, requests_level), 2),
+            "tokens_available": round(max(0.0, tokens_level)),
+            "blocked_for": round(max(0.0, blocked_until - now), 2),
+        }
+
+
+def parse_quotas(spec: str):
+    """'gemini-2.0-flash=15/1000000,gemini-pro-latest=2/32000' -> {model: (rpm, tpm)}"""
+    quotas = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        name, limits = part.split("=", 1)
+        rpm, _, tpm = limits.partition("/")
+        name = name.strip()
+        if not name.startswith("models/"):
+            name = f"models/{name}"
+        quotas[name] = (float(rpm), float(tpm or "inf"))
+    return quotas
+
+
+class _Waiter:
+    __slots__ = ("rank", "priority", "tokens", "future", "enqueued")
+
+    def __init__(self, rank, priority, tokens):
+        self.rank = rank
+        self.priority = priority
+        self.tokens = tokens
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+
+
+class QuotaScheduler:
+    """
+    Admission control for Gemini calls. Each model has an RPM and a TPM token
+    bucket; callers wait in a per-model priority queue (lower rank first, FIFO
+    within a rank) and are granted in order as the buckets refill.
+
+    A call is rejected up front with QuotaExceeded when its priority class's
+    queue is full, or when the estimated wait already exceeds its deadline,
+    so the endpoint can answer 503 / fall back instead of holding the socket.
+    """
+    def __init__(self, models, rpm=None, tpm=None, quotas: dict = None, queue_limit=None, state=None):
+        rpm = rpm or float(os.getenv("AI_RPM", "60"))
+        tpm = tpm or float(os.getenv("AI_TPM", "1000000"))
+        overrides = quotas if quotas is not None else parse_quotas(os.getenv("AI_QUOTAS", ""))
+        # Buckets live in `state`; the queues below are per process
+        state = state or LocalState()
+        self.quotas = {m: ModelQuota(m, *overrides.get(m, (rpm, tpm)), state=state) for m in models}
+        self.queue_limit = queue_limit or int(os.getenv("AI_QUEUE_LIMIT", "32"))
+        self._queues = {m: [] for m in models}
+        self._pumps = {}
+        self._seq = itertools.count()
+        self.stats = {
+            "admitted": {p: 0 for p in PRIORITY_CLASSES},
+            "rejected": {p: 0 for p in PRIORITY_CLASSES},
+            "throttled": 0,
+            "total_wait": {p: 0.0 for p in PRIORITY_CLASSES},
+        }
+
+    def _ahead(self, model: str, rank: int):
+        return [w for _, _, w in self._queues[model] if w.rank <= rank and not w.future.done()]
+
+    def _reject(self, model: str, priority: str, reason: str, retry_after: float):
+        self.stats["rejected"][priority] += 1
+        QUOTA_REJECTIONS.inc(model=model, priority=priority, reason=reason)
+        raise QuotaExceeded(f"{model}: {reason}", retry_after=max(1.0, retry_after))
+
+    async def acquire(self, model: str, priority: str = "standard", tokens: float = 1, max_wait: float = None):
+        quota = self.quotas.get(model)
+        if quota is None:
+            return
+        rank, default_wait = PRIORITY_CLASSES[priority]
+        max_wait = default_wait if max_wait is None else max_wait
+        ahead = self._ahead(model, rank)
+        eta = await quota.time_until(sum(w.tokens for w in ahead) + tokens, len(ahead) + 1)
+        if sum(1 for w in ahead if w.rank == rank) >= self.queue_limit:
+            self._reject(model, priority, "queue full", eta)
+        if eta > max_wait:
+            self._reject(model, priority, "quota wait exceeds deadline", eta)
+
+        if not ahead and eta <= 0 and await quota.try_take(tokens) <= 0:
+            self.stats["admitted"][priority] += 1
+            return
+
+        waiter = _Waiter(rank, priority, tokens)
+        heapq.heappush(self._queues[model], (rank, next(self._seq), waiter))
+        self._ensure_pump(model)
+        try:
+            with span("quota_wait"):
+                await asyncio.wait_for(asyncio.shield(waiter.future), max_wait)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                waiter.future.cancel()
+                self._reject(model, priority, "quota wait exceeds deadline", await quota.time_until(tokens))
+        except asyncio.CancelledError:
+            # Caller went away; if it was already granted the quota is spent either way
+            waiter.future.cancel()
+            raise
+        self.stats["admitted"][priority] += 1
+        self.stats["total_wait"][priority] += time.monotonic() - waiter.enqueued
+
+    def _ensure_pump(self, model: str):
+        pump = self._pumps.get(model)
+        if pump is None or pump.done() or pump.get_loop() is not asyncio.get_running_loop():
+            self._pumps[model] = asyncio.ensure_future(self._pump(model))
+
+    async def _pump(self, model: str):
+        queue = self._queues[model]
+        quota = self.quotas[model]
+        while queue:
+            entry = queue[0]
+            head = entry[2]
+            if head.future.done():
+                heapq.heappop(queue)
+                continue
+            wait = await quota.try_take(head.tokens)
+            if wait > 0:
+                # Re-checked after the sleep: a higher-priority waiter (or another worker) may have moved first
+                await asyncio.sleep(min(wait, 0.25))
+                continue
+            # The queue may have changed while the bucket was read; grant the waiter the quota was taken for
+            queue.remove(entry)
+            heapq.heapify(queue)
+            if not head.future.done():
+                head.future.set_result(None)
+
+    async def throttle(self, model: str, seconds: float):
+        quota = self.quotas.get(model)
+        if quota is not None:
+            self.stats["throttled"] += 1
+            await quota.throttle(seconds)
+
+    def snapshot(self):
+        models = {}
+        for model, quota in self.quotas.items():
+            models[model] = {**quota.snapshot(), "queued": len(self._ahead(model, len(PRIORITY_CLASSES)))}
+        avg_wait = {
+            p: round(self.stats["total_wait"][p] / self.stats["admitted"][p], 3) if self.stats["admitted"][p] else 0.0
+            for p in PRIORITY_CLASSES
+        }
+        return {
+            "admitted": dict(self.stats["admitted"]),
+            "rejected": dict(self.stats["rejected"]),
+            "throttled": self.stats["throttled"],
+            "avg_wait": avg_wait,
+            "queue_limit": self.queue_limit,
+            "models": models,
+        }
@@ -1,4 +1,252 @@
-from duckduckgo_search import DDGS
+import asyncio
+import os
+import queue
+import threading
+import time
+
+from cache import PersistentTTLCache, normalize_key
+from knowledge_base import KnowledgeBase
+from metrics import STARTUP_SECONDS, Counter, log_event, span
+from shared_state import LocalState, after_fork, shared_state
+
+# Per-query deadline; a slow query is dropped instead of holding up the rest
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "8"))
+
+# Shared across all search functions; keyed on normalized query text
+search_cache = PersistentTTLCache(
+    "search",
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", str(6 * 3600))),
+    max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "2000"))
+)
+
+
+# Every snippet fetched upstream is also indexed here, so /ask-ai can answer from it later
+knowledge_base = KnowledgeBase()
+
+
+def _index_failed(task):
+    if not task.cancelled() and task.exception():
+        log_event("kb_index_failed", error=str(task.exception()))
+
+
+# duckduckgo_search.DDGS, imported by load_ddgs() (startup warm-up or first search)
+DDGS = None
+
+
+def load_ddgs():
+    global DDGS
+    if DDGS is None:
+        started = time.perf_counter()
+        from duckduckgo_search import DDGS as client
+        DDGS = client
+        STARTUP_SECONDS.set(round(time.perf_counter() - started, 4), step="import_ddgs")
+    return DDGS
+
+
+SEARCH_UPSTREAM = Counter(
+    "careerflow_search_upstream_total", "DuckDuckGo queries by outcome (ok, timeout, error, rate_limited, backed_off)",
+    ("outcome",)
+)
+
+
+def _close_session(session):
+    # DDGS is a context manager; releases built on httpx also hold a client that needs an explicit close
+    session.__exit__(None, None, None)
+    client = getattr(session, "client", None)
+    if callable(getattr(client, "close", None)):
+        client.close()
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    # duckduckgo_search raises RatelimitException for 202/403/418/429 answers
+    return "ratelimit" in type(error).__name__.lower() or "ratelimit" in str(error).lower() or "429" in str(error)
+
+
+class SearchClient:
+    """
+    Long-lived DuckDuckGo client shared by every search function.
+
+    Keeps a small pool of DDGS sessions (each holds its own keep-alive
+    connection pool and cookies) instead of opening one per query, caps the
+    number of upstream queries in flight, and on a rate-limit answer backs
+    off globally: until the cool-down ends every query returns [] at once
+    (cached results are still served). The cool-down doubles on each
+    consecutive rate limit and lives in the shared state store, so all
+    workers back off together.
+    """
+    def __init__(self, max_concurrency=None, timeout=None, backoff_base=None, backoff_max=None, state=None):
+        # Default covers the fan-out of one guide request (5 queries) with room for a second
+        self.max_concurrency = max_concurrency or int(os.getenv("SEARCH_MAX_CONCURRENCY", "8"))
+        self.timeout = timeout or SEARCH_TIMEOUT
+        self.backoff_base = backoff_base or float(os.getenv("SEARCH_BACKOFF_BASE", "5"))
+        self.backoff_max = backoff_max or float(os.getenv("SEARCH_BACKOFF_MAX", "300"))
+        self.store = state or LocalState()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        # Sessions hold live sockets; a forked worker opens its own
+        after_fork(self._after_fork)
+        self.stats = {"queries": 0, "sessions_opened": 0, "rate_limited": 0, "backed_off": 0, "peak_in_flight": 0}
+        self._in_flight = 0
+
+    def _after_fork(self):
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Imports the SDK and opens the first session (called from the startup warm-up)."""
+        self._release(self._acquire())
+
+    def close(self):
+        """Closes every idle session; sessions still running a query are closed when they come back."""
+        self._closed = True
+        while True:
+            try:
+                _close_session(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        # The semaphore bounds callers, so at most max_concurrency sessions are ever opened
+        with self._lock:
+            self._created += 1
+            self.stats["sessions_opened"] += 1
+        return load_ddgs()(timeout=int(self.timeout))
+
+    def _release(self, session):
+        if self._closed:
+            _close_session(session)
+            return
+        self._idle.put(session)
+
+    def _text(self, query: str, max_results: int):
+        # Blocking I/O - always called through asyncio.to_thread
+        session = self._acquire()
+        try:
+            # DDGS paces requests on a reused session (0.75s sleep); the cap and the
+            # shared backoff already do that job here
+            session.sleep_timestamp = 0.0
+            return list(session.text(query, max_results=max_results))
+        finally:
+            self._release(session)
+
+    def _remaining(self, backoff) -> float:
+        return max(0.0, backoff["until"] - time.time()) if backoff else 0.0
+
+    def blocked_for(self) -> float:
+        return self._remaining(self.store.get("search:backoff"))
+
+    async def _backed_off(self) -> bool:
+        if self._remaining(await self.store.aget("search:backoff")) <= 0:
+            return False
+        self.stats["backed_off"] += 1
+        SEARCH_UPSTREAM.inc(outcome="backed_off")
+        return True
+
+    async def _record_rate_limit(self):
+        def strike(current):
+            strikes = (current or {}).get("strikes", 0) + 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (strikes - 1))
+            return {"strikes": strikes, "until": time.time() + delay}, delay
+        delay = await self.store.aupdate("search:backoff", strike, ttl=self.backoff_max * 2)
+        log_event("search_rate_limited", backoff_s=round(delay))
+
+    async def _record_success(self):
+        if await self.store.aget("search:backoff") is not None:
+            await self.store.adelete("search:backoff")
+
+    async def text(self, query: str, max_results: int, timeout: float = None):
+        """
+        Raw result dicts for one query, or [] when backed off, failed or past
+        the deadline. The deadline covers the wait for a free slot as well.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        if await self._backed_off():
+            return []
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            SEARCH_UPSTREAM.inc(outcome="timeout")
+            log_event("search_timeout", query=query, waiting_for_slot=True)
+            return []
+        # Checked again: a query ahead of this one may have hit the rate limit while it waited
+        if await self._backed_off():
+            self._semaphore.release()
+            return []
+        self.stats["queries"] += 1
+        self._in_flight += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self._in_flight)
+        worker = asyncio.ensure_future(asyncio.to_thread(self._text, query, max_results))
+        try:
+            with span("ddgs_query"):
+                results = await asyncio.wait_for(asyncio.shield(worker), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            SEARCH_UPSTREAM.inc(outcome="timeout")
+            log_event("search_timeout", query=query)
+            return []
+        except Exception as e:
+            if _is_rate_limited(e):
+                self.stats["rate_limited"] += 1
+                SEARCH_UPSTREAM.inc(outcome="rate_limited")
+                await self._record_rate_limit()
+            else:
+                SEARCH_UPSTREAM.inc(outcome="error")
+                log_event("search_error", query=query, error=str(e))
+            return []
+        else:
+            SEARCH_UPSTREAM.inc(outcome="ok")
+            await self._record_success()
+            return results
+        finally:
+            # After the outcome is recorded, so a query waiting for the slot sees a new backoff;
+            # an abandoned query keeps its slot until its thread finishes
+            if worker.done():
+                self._finish_query()
+            else:
+                worker.add_done_callback(self._finish_query)
+
+    def _finish_query(self, _=None):
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            "max_concurrency": self.max_concurrency,
+            "idle_sessions": self._idle.qsize(),
+            "in_flight": self._in_flight,
+            "blocked_for": round(self.blocked_for(), 2),
+        }
+
+
+search_client = SearchClient(state=shared_state)
+
+
+async def _run_query(query: str, max_results: int, timeout: float = None):
+    """
+    Runs a single DDGS query through the shared search client.
+    Returns raw result dicts, or [] if the query failed, timed out or is backed off.
+    Non-empty results are cached so repeat queries skip the upstream call.
+    """
+    key = f"{max_results}:{normalize_key(query)}"
+    cached = await search_cache.aget(key)
+    if cached is not None:
+        return cached
+    results = await search_client.text(query, max_results, timeout)
+    if results:
+        await search_cache.aset(key, results)
+        # Off the request path; the answer does not wait for the index write
+        asyncio.ensure_future(asyncio.to_thread(knowledge_base.add, results)).add_done_callback(_index_failed)
+    return results
 
 
 async def search_company_interview(company_name: str):
@@ -7,38 +255,20 @@ async def search_company_interview(company_name: str):
     """
     # Multi-faceted query for maximum richness
     query = f"{company_name} technical interview rounds interview experiences process technical questions 2024 2025"
-    results = []
-    
-    try:
-        with DDGS() as ddgs:
-            # Increased results for better AI context
-            for r in ddgs.text(query, max_results=15):
-                results.append({
-                    "title": r.get("title", ""),
-                    "body": r.get("body", ""),
-                    "link": r.get("href", "")
-                })
-    except Exception as e:
-        print(f"Search Error: {e}")
-            
-    return results
+    # Increased results for better AI context
+    return [
+        {"title": r.get("title", ""), "body": r.get("body", ""), "link": r.get("href", "")}
+        for r in await _run_query(query, max_results=15)
+    ]
 
 async def search_general(query: str):
     """
     Performs a general web search for MCQs and technical deep-dives.
     """
-    results = []
-    try:
-        with DDGS() as ddgs:
-            for r in ddgs.text(query, max_results=12):
-                results.append({
-                    "title": r.get("title", ""),
-                    "body": r.get("body", ""),
-                    "link": r.get("href", "")
-                })
-    except Exception as e:
-        print(f"General Search Error: {e}")
-    return results
+    return [
+        {"title": r.get("title", ""), "body": r.get("body", ""), "link": r.get("href", "")}
+        for r in await _run_query(query, max_results=12)
+    ]
 
 async def search_practice_links(company_name: str):
     """
@@ -54,25 +284,23 @@ async def search_practice_links(company_name: str):
     links = []
     seen_urls = set()
     
-    try:
-        with DDGS() as ddgs:
-            for query in queries:
-                for r in ddgs.text(query, max_results=5):
-                    url = r.get("href", "")
-                    if url and url not in seen_urls:
-                        title = r.get("title", "")
-                        # Enhancing titles for a very professional UI feel
-                        if "leetcode" in url.lower(): title = f"LeetCode: {company_name} Track"
-                        elif "geeksforgeeks" in url.lower(): title = f"GeeksforGeeks: {company_name} Experience"
-                        elif "interviewbit" in url.lower(): title = f"InterviewBit: {company_name} Path"
-                        elif "glassdoor" in url.lower(): title = f"Glassdoor: {company_name} Insights"
-                        
-                        links.append({"title": title, "link": url})
-                        seen_urls.add(url)
-                    if len(links) >= 8: break
-                if len(links) >= 8: break
-    except Exception as e:
-        print(f"Link Search Error: {e}")
+    # All queries run concurrently; merging keeps the original query priority order
+    batches = await asyncio.gather(*[_run_query(q, max_results=5) for q in queries])
+    for batch in batches:
+        for r in batch:
+            url = r.get("href", "")
+            if url and url not in seen_urls:
+                title = r.get("title", "")
+                # Enhancing titles for a very professional UI feel
+                if "leetcode" in url.lower(): title = f"LeetCode: {company_name} Track"
+                elif "geeksforgeeks" in url.lower(): title = f"GeeksforGeeks: {company_name} Experience"
+                elif "interviewbit" in url.lower(): title = f"InterviewBit: {company_name} Path"
+                elif "glassdoor" in url.lower(): title = f"Glassdoor: {company_name} Insights"
+                
+                links.append({"title": title, "link": url})
+                seen_urls.add(url)
+            if len(links) >= 8: break
+        if len(links) >= 8: break
     
     # Static but highly professional fallbacks
     fallbacks = [
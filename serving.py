@@ -0,0 +1,113 @@
+"""
+Production launcher: one preloaded app, N forked uvicorn workers on a shared socket.
+
+    python server.py --workers 4               # or WEB_CONCURRENCY=4 python server.py
+    SHARED_STATE=sqlite python server.py --workers 4
+    SHARED_STATE=redis://localhost:6379/0 python server.py --workers 8
+
+The app (and its heavy imports) is loaded once in the parent before forking,
+so workers start fast and share memory copy-on-write. With more than one
+worker, set SHARED_STATE so Gemini quota buckets, circuit breakers and caches
+are shared; with the default `local` backend every worker would get the
+full quota to itself.
+"""
+import argparse
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+from metrics import log_event
+
+WORKER_ENV = "CAREERFLOW_WORKER_ID"
+
+
+def is_primary_worker() -> bool:
+    """True in a single-process server and in worker 0; singleton background jobs run only there."""
+    return os.getenv(WORKER_ENV, "0") == "0"
+
+
+def _bind(host: str, port: int):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock, worker_id: int, log_level: str):
+    os.environ[WORKER_ENV] = str(worker_id)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level, timeout_keep_alive=5)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def run_workers(app, host: str, port: int, workers: int, log_level: str = "info"):
+    """Forks `workers` processes serving `app`; restarts any that die until SIGINT/SIGTERM."""
+    sock = _bind(host, port)
+    children = {}
+    stopping = False
+
+    def spawn(worker_id: int):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(app, sock, worker_id, log_level)
+            finally:
+                os._exit(0)
+        children[pid] = worker_id
+        log_event("worker_started", worker=worker_id, pid=pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    log_event("serving", url=f"http://{host}:{port}", workers=workers, pid=os.getpid())
+    for worker_id in range(workers):
+        spawn(worker_id)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        worker_id = children.pop(pid, None)
+        if worker_id is not None and not stopping:
+            log_event("worker_restarting", worker=worker_id, pid=pid, status=status)
+            time.sleep(1)
+            spawn(worker_id)
+    sock.close()
+
+
+def main(app, preload=None):
+    parser = argparse.ArgumentParser(description="Run the CareerFlow API")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level)
+        return
+    from shared_state import shared_state
+    if shared_state.describe()["backend"] == "local":
+        log_event("shared_state_local", workers=args.workers,
+                  warning="each worker enforces the Gemini quota on its own")
+    if preload is not None:
+        # Heavy imports once in the parent; workers inherit them copy-on-write
+        preload()
+    run_workers(app, args.host, args.port, args.workers, args.log_level)
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- SHARED STATE (quota buckets, breaker status, caches across worker processes) ---
+
+# local (one process) | sqlite (all workers on this host) | redis://host:6379/0 (any number of hosts)
+SHARED_STATE = os.getenv("SHARED_STATE", "local")
+# How often a SQLite store deletes rows whose TTL has passed (reads already ignore them)
+SHARED_STATE_PURGE_INTERVAL = float(os.getenv("SHARED_STATE_PURGE_INTERVAL", "300"))
+
+
+def after_fork(callback):
+    """Runs `callback` in every forked child; a no-op where there is no fork (Windows)."""
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=callback)
+
+
+class LocalState:
+    """
+    Process-local key/value store. Every backend offers the same small API:
+    get / set (with optional TTL) / delete, plus update(key, fn), an atomic
+    read-modify-write where fn(old_value) returns (new_value, result).
+
+    Code on the event loop uses the async twins (aget / aset / adelete /
+    aupdate): here they run inline, the SQLite and Redis backends run the
+    blocking call in a thread.
+    """
+    remote = False
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        after_fork(self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is None or (item[1] is not None and item[1] <= now):
+            self._data.pop(key, None)
+            return None
+        return item[0]
+
+    def get(self, key: str):
+        with self._lock:
+            return self._live(key, time.time())
+
+    def set(self, key: str, value, ttl: float = None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def update(self, key: str, fn, ttl: float = None):
+        with self._lock:
+            value, result = fn(self._live(key, time.time()))
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            return result
+
+    async def aget(self, key: str):
+        return self.get(key)
+
+    async def aset(self, key: str, value, ttl: float = None):
+        self.set(key, value, ttl)
+
+    async def adelete(self, key: str):
+        self.delete(key)
+
+    async def aupdate(self, key: str, fn, ttl: float = None):
+        return self.update(key, fn, ttl)
+
+    def describe(self):
+        return {"backend": "local"}
+
+
+class _BlockingState:
+    # Async twins for backends whose calls do I/O: off the event loop, one thread each
+    async def aget(self, key: str):
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value, ttl: float = None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    async def adelete(self, key: str):
+        await asyncio.to_thread(self.delete, key)
+
+    async def aupdate(self, key: str, fn, ttl: float = None):
+        return await asyncio.to_thread(self.update, key, fn, ttl)
+
+
+class SQLiteState(_BlockingState):
+    """
+    Shared by every process on one host through a WAL-mode SQLite file.
+    Each thread of each process (including forked workers) opens its own
+    connection; update() runs inside BEGIN IMMEDIATE so read-modify-write is
+    atomic. Expired rows are deleted every SHARED_STATE_PURGE_INTERVAL.
+    """
+    remote = False
+
+    def __init__(self, path: str = None, purge_interval: float = None):
+        self.path = path or os.path.join(os.getenv("CAREERFLOW_CACHE_DIR", ".cache"), "shared_state.sqlite3")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self.purge_interval = purge_interval or SHARED_STATE_PURGE_INTERVAL
+        self._next_purge = time.time() + self.purge_interval
+        self.purged = 0
+        db = self._conn()
+        db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)")
+        db.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires)")
+
+    def _conn(self):
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _read(self, db, key, now):
+        row = db.execute("SELECT value, expires FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        return json.loads(row[0])
+
+    def get(self, key: str):
+        return self._read(self._conn(), key, time.time())
+
+    def _maybe_purge(self, db, now):
+        # Piggybacks on writes; whichever worker gets here first does it for the whole host
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_interval
+        self.purged += db.execute("DELETE FROM kv WHERE expires <= ?", (now,)).rowcount
+
+    def set(self, key: str, value, ttl: float = None):
+        db = self._conn()
+        now = time.time()
+        db.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), now + ttl if ttl else None)
+        )
+        self._maybe_purge(db, now)
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def update(self, key: str, fn, ttl: float = None):
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            value, result = fn(self._read(db, key, now))
+            db.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None)
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._maybe_purge(db, now)
+        return result
+
+    def describe(self):
+        return {"backend": "sqlite", "path": self.path, "purged": self.purged}
+
+
+class RedisState(_BlockingState):
+    """
+    Redis-compatible backend. Takes a redis-py style client; pass
+    fakeredis.FakeRedis() (or any client with get/set/delete/pipeline) to run
+    without a server. update() uses WATCH/MULTI and retries on conflict.
+    """
+    remote = True
+
+    def __init__(self, url: str = None, client=None, prefix: str = "careerflow:"):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.url = url
+        self.prefix = prefix
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value, ttl: float = None):
+        self.client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def update(self, key: str, fn, ttl: float = None):
+        from redis.exceptions import WatchError
+
+        name = self.prefix + key
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(name)
+                    raw = pipe.get(name)
+                    value, result = fn(json.loads(raw) if raw is not None else None)
+                    pipe.multi()
+                    pipe.set(name, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+                    pipe.execute()
+                    return result
+                except WatchError:
+                    continue
+
+    def describe(self):
+        return {"backend": "redis", "url": self.url, "prefix": self.prefix}
+
+
+def open_shared_state(spec: str = None):
+    spec = spec or SHARED_STATE
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState(url=spec)
+    if spec == "sqlite" or spec.startswith("sqlite:"):
+        # "sqlite" uses the cache directory; "sqlite:/path/to/state.sqlite3" an explicit file
+        return SQLiteState(spec.partition(":")[2] or None)
+    return LocalState()
+
+
+# Process-wide instance; forked workers inherit the choice and reconnect on first use
+shared_state = open_shared_state()